@@ -1,7 +1,17 @@
 from enum import Enum
+import numpy as np
 import pandas as pd
 from typing import List, Optional
 
+try:
+    from numba import njit
+except ImportError:
+    # 未安装 numba 时退化为普通 Python 函数（结果一致，仅速度较慢）
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
 # =================================================================================================
 # 缠论核心逻辑库 (Chan Theory Core Library)
 #
@@ -11,6 +21,10 @@ from typing import List, Optional
 # 3. 笔的绘制 (Bi/Stroke Drawing) - 包含严格的5K原则和回溯逻辑
 # =================================================================================================
 
+# 引擎内部价格数组的数据类型：保持 float64，float32 在 13 万以上已无法区分以分为单位的价格，
+# 内核的比较结果（标准K线、分型、笔）会随之改变
+PRICE_DTYPE = np.float64
+
 class Direction(Enum):
     """趋势方向枚举 / Trend Direction Enum"""
     UP = 1    # 向上
@@ -23,8 +37,17 @@ class ChanKLine:
     用于存储包含处理后的K线数据。
     包含处理后的K线可能由多根原始K线合并而成。
     """
-    def __init__(self, index, datetime, open_price, high, low, close, volume, original_klines=None):
+    # 使用 __slots__ 省去每个实例的 __dict__，降低内存占用并加快属性访问
+    __slots__ = ('index', 'datetime', 'open', 'high', 'low', 'close', 'volume',
+                 'start_index', 'end_index', '_original_klines', '_original_range')
+
+    def __init__(self, index, datetime, open_price, high, low, close, volume, original_klines=None,
+                 start_index=None, end_index=None):
         self.index = index
+        # 构成这根K线的原始K线索引范围（闭区间），原始K线即 [index, index]
+        # 绘图只需首尾索引，读取这两个字段即可，无需遍历 original_klines
+        self.start_index = index if start_index is None else start_index
+        self.end_index = index if end_index is None else end_index
         self.datetime = datetime
         self.open = open_price
         self.high = high
@@ -33,7 +56,22 @@ class ChanKLine:
         self.volume = volume
         # List of original KLines this standard KLine is composed of (for traceability)
         # 构成这根标准K线的原始K线列表（用于溯源）
-        self.original_klines = original_klines if original_klines else []
+        self._original_klines = original_klines if original_klines else []
+        # 延迟构建时的来源：(engine, start, end)，对应 engine.raw_klines[start:end]
+        self._original_range = None
+
+    @property
+    def original_klines(self):
+        if self._original_range is not None:
+            engine, start, end = self._original_range
+            self._original_klines = engine.raw_klines[start:end]
+            self._original_range = None
+        return self._original_klines
+
+    @original_klines.setter
+    def original_klines(self, value):
+        self._original_klines = value
+        self._original_range = None
 
     def __repr__(self):
         return f"KLine(dt={self.datetime}, H={self.high}, L={self.low})"
@@ -49,9 +87,12 @@ class FenXing:
     
     记录分型的关键信息：类型（顶/底）、时间、极值点。
     """
-    def __init__(self, k_line: ChanKLine, type: FenXingType):
+    __slots__ = ('k_line', 'type', 'std_idx', 'datetime', 'high', 'low')
+
+    def __init__(self, k_line: ChanKLine, type: FenXingType, std_idx: Optional[int] = None):
         self.k_line = k_line # 分型中间的那根K线
         self.type = type
+        self.std_idx = std_idx # 中间K线在标准K线列表中的位置
         self.datetime = k_line.datetime
         self.high = k_line.high
         self.low = k_line.low
@@ -68,6 +109,8 @@ class Bi:
     Direction.UP: 底 -> 顶 (向上笔)
     Direction.DOWN: 顶 -> 底 (向下笔)
     """
+    __slots__ = ('start_fx', 'end_fx', 'direction', 'high', 'low')
+
     def __init__(self, start_fx: FenXing, end_fx: FenXing):
         self.start_fx = start_fx
         self.end_fx = end_fx
@@ -79,33 +122,260 @@ class Bi:
         d = "UP" if self.direction == Direction.UP else "DOWN"
         return f"Bi({d}, {self.start_fx.datetime} -> {self.end_fx.datetime})"
 
+# =================================================================================================
+# Numba 加速内核 (Numba Kernels)
+#
+# 包含处理、画笔等步骤都是严格顺序依赖的状态机（每一步依赖上一步的结果），无法用 NumPy 向量化，
+# 因此用 @njit 编译为机器码。内核只接收/输出 NumPy 数组，由 ChanEngine 负责包装成对象。
+#
+# 内核声明了显式签名（价格为连续 float64 数组），在导入时即完成编译并缓存到磁盘，
+# 之后的运行直接加载缓存，GUI 首次计算不再有 JIT 编译延迟。
+# 内核只做大小比较，fastmath 不影响结果。
+# =================================================================================================
+
+@njit("Tuple((float64[::1], float64[::1], int64[::1], int64[::1]))(float64[::1], float64[::1])",
+      cache=True, fastmath=True, boundscheck=False)
+def _process_inclusion_nb(high, low):
+    """
+    K线包含处理内核。
+    返回标准K线的 (high, low, start, end) 数组，
+    第 i 根标准K线由原始K线 [start[i], end[i]) 合并而成。
+    """
+    # 标准K线数量不超过原始K线数量：按上限预分配，用写游标代替 append
+    n = high.shape[0]
+    out_high = np.empty(n, dtype=high.dtype)
+    out_low = np.empty(n, dtype=low.dtype)
+    out_start = np.empty(n, dtype=np.int64)
+    out_end = np.empty(n, dtype=np.int64)
+    if n == 0:
+        return out_high, out_low, out_start, out_end
+
+    out_high[0] = high[0]
+    out_low[0] = low[0]
+    out_start[0] = 0
+    out_end[0] = 1
+    cursor = 1
+    # 当前趋势方向：只在追加新K线时更新（合并不会改变末尾两根K线的高低关系），只有一根时默认向上
+    is_up = True
+
+    for i in range(1, n):
+        last_high = out_high[cursor - 1]
+        last_low = out_low[cursor - 1]
+        next_high = high[i]
+        next_low = low[i]
+
+        # Case 1: 左包右 / Case 2: 右包左
+        # 高点差与低点差异号（或任一为零）即存在包含关系，用乘积判断避免短路分支
+        if (last_high - next_high) * (last_low - next_low) <= 0:
+            if is_up:
+                # 向上趋势：高点取大，低点取大 (GG-DG)
+                out_high[cursor - 1] = max(last_high, next_high)
+                out_low[cursor - 1] = max(last_low, next_low)
+            else:
+                # 向下趋势：高点取小，低点取小 (GD-DD)
+                out_high[cursor - 1] = min(last_high, next_high)
+                out_low[cursor - 1] = min(last_low, next_low)
+            # 合并只需延长区间终点，无需复制原始K线列表
+            out_end[cursor - 1] = i + 1
+        else:
+            # 趋势方向由新K线与前一根标准K线的高点关系决定
+            is_up = next_high >= last_high
+            out_high[cursor] = next_high
+            out_low[cursor] = next_low
+            out_start[cursor] = i
+            out_end[cursor] = i + 1
+            cursor += 1
+
+    return out_high[:cursor], out_low[:cursor], out_start[:cursor], out_end[:cursor]
+
+@njit("Tuple((int64[::1], int8[::1], int64[::1], int64[::1]))(float64[::1], float64[::1])",
+      cache=True, fastmath=True, boundscheck=False)
+def _fenxing_bi_nb(high, low):
+    """
+    分型识别 + 画笔融合内核。
+    单次扫描标准K线：每识别出一个分型，立即送入画笔状态机。
+    返回分型的 (位置, 类型 1 顶 / -1 底) 数组，以及每一笔起止分型序号的 (start, end) 数组。
+    """
+    # 分型与笔的数量都不超过 n - 2，按上限预分配
+    n = high.shape[0]
+    cap = max(n - 2, 0)
+    fx_idx = np.empty(cap, dtype=np.int64)
+    fx_type = np.empty(cap, dtype=np.int8)
+    bi_start = np.empty(cap, dtype=np.int64)
+    bi_end = np.empty(cap, dtype=np.int64)
+
+    n_fx = 0
+    n_bi = 0
+    start = 0 # 当前笔的起点候选（分型序号）
+    for i in range(1, n - 1):
+        h = high[i]
+        l = low[i]
+        # 顶分型：中间K线高点最高，低点最高；底分型：中间K线高点最低，低点最低
+        if h > high[i - 1] and h > high[i + 1] and l > low[i - 1] and l > low[i + 1]:
+            t = 1
+        elif h < high[i - 1] and h < high[i + 1] and l < low[i - 1] and l < low[i + 1]:
+            t = -1
+        else:
+            continue
+
+        j = n_fx
+        fx_idx[j] = i
+        fx_type[j] = t
+        n_fx += 1
+        if j == 0:
+            continue
+
+        start_high = high[fx_idx[start]]
+        start_low = low[fx_idx[start]]
+        is_top = fx_type[start] == 1
+
+        # 1. 同类型分型：若更极端（顶更高 / 底更低）则更新起点，并同步更新上一笔的终点
+        if t == fx_type[start]:
+            if (is_top and h >= start_high) or (not is_top and l <= start_low):
+                start = j
+                if n_bi > 0:
+                    bi_end[n_bi - 1] = j
+            continue
+
+        # 2. 不同类型：5K原则 (索引差 >= 4) + 数值力度检查
+        has_enough_bars = (i - fx_idx[start]) >= 4
+        if is_top:
+            value_check = start_high > h and start_low > l
+        else:
+            value_check = start_low < l and start_high < h
+
+        if has_enough_bars and value_check:
+            bi_start[n_bi] = start
+            bi_end[n_bi] = j
+            n_bi += 1
+            start = j # 当前终点即下一笔的起点
+        # 否则忽略该候选终点，保留起点继续往后找
+
+    return fx_idx[:n_fx], fx_type[:n_fx], bi_start[:n_bi], bi_end[:n_bi]
+
+def prewarm():
+    """在小数组上运行一次各内核，提前加载（或编译）机器码"""
+    high = np.array([3.0, 2.0, 4.0, 1.0, 5.0], dtype=PRICE_DTYPE)
+    low = high - 1
+    _process_inclusion_nb(high, low)
+    _fenxing_bi_nb(high, low)
+
+prewarm()
+
+def compute_chan(high, low):
+    """
+    纯数组接口：不构建任何对象，直接对高低价数组执行包含处理、分型识别与画笔。
+    适合批量/回测场景，例如 compute_chan(df['high'].to_numpy(), df['low'].to_numpy())。
+
+    返回 (std_high, std_low, std_start, std_end, fx_idx, fx_type, bi_start, bi_end)：
+    - std_start/std_end: 每根标准K线覆盖的原始K线区间 [start, end)
+    - fx_idx/fx_type: 分型所在的标准K线位置与类型 (1 顶 / -1 底)
+    - bi_start/bi_end: 笔的起止分型在 fx_idx 中的序号
+    """
+    high = np.require(high, PRICE_DTYPE, ['C', 'W'])
+    low = np.require(low, PRICE_DTYPE, ['C', 'W'])
+    std_high, std_low, std_start, std_end = _process_inclusion_nb(high, low)
+    fx_idx, fx_type, bi_start, bi_end = _fenxing_bi_nb(std_high, std_low)
+    return std_high, std_low, std_start, std_end, fx_idx, fx_type, bi_start, bi_end
+
 class ChanEngine:
     """
     缠论计算引擎 (Chan Calculation Engine)
     
     输入原始K线DataFrame，执行包含处理、分型识别、画笔等操作。
+
+    内部以 NumPy 平行数组 (SoA) 保存K线数据，ChanKLine 对象仅在访问
+    raw_klines / standard_klines 时按需构建。
     """
     def __init__(self, df: pd.DataFrame):
-        self.raw_klines = []
-        # 将DataFrame转换为ChanKLine对象列表
-        for i, row in df.iterrows():
-            k = ChanKLine(
-                index=i,
-                datetime=row['datetime'],
-                open_price=row['open'],
-                high=row['high'],
-                low=row['low'],
-                close=row['close'],
-                volume=row['volume'],
-                original_klines=[] # Will populate this if needed, but for now it's self
-            )
-            k.original_klines.append(k)
-            self.raw_klines.append(k)
-            
-        self.standard_klines = [] # 存储包含处理后的K线
+        # 原始K线 (SoA)：索引使用行位置 (0, 1, 2...)，与 mplfinance 的 X 轴坐标一致
+        # 价格列统一为连续的 float64 数组，供内核顺序读取，K线对象也直接由这些数组构建。
+        # 内核签名要求可写数组：若 df 已是 float64，to_numpy() 可能返回只读视图，此时复制一份。
+        self._dt = df['datetime'].to_numpy()
+        self._open = np.require(df['open'].to_numpy(), PRICE_DTYPE, ['C', 'W'])
+        self._high = np.require(df['high'].to_numpy(), PRICE_DTYPE, ['C', 'W'])
+        self._low = np.require(df['low'].to_numpy(), PRICE_DTYPE, ['C', 'W'])
+        self._close = np.require(df['close'].to_numpy(), PRICE_DTYPE, ['C', 'W'])
+        self._vol = np.ascontiguousarray(df['volume'].to_numpy(), dtype=np.float64)
+
+        # 标准K线 (SoA)：第 i 根标准K线由原始K线 [_std_orig_start[i], _std_orig_end[i]) 合并而成
+        self._std_high = np.empty(0, dtype=PRICE_DTYPE)
+        self._std_low = np.empty(0, dtype=PRICE_DTYPE)
+        self._std_orig_start = np.empty(0, dtype=np.int64)
+        self._std_orig_end = np.empty(0, dtype=np.int64)
+        # 原始K线位置 -> 所属标准K线位置
+        self._raw_to_std = np.empty(0, dtype=np.int64)
+
+        # 分型 (SoA)：分型中间K线在标准K线中的位置、类型 (1 顶 / -1 底)
+        self._fx_idx = np.empty(0, dtype=np.int64)
+        self._fx_type = np.empty(0, dtype=np.int8)
+        # 笔 (SoA)：每一笔起止分型的序号，由 find_fenxing 的融合内核一并算出
+        self._bi_start = np.empty(0, dtype=np.int64)
+        self._bi_end = np.empty(0, dtype=np.int64)
+
+        self._raw_klines = None      # 按需构建的原始K线对象
+        self._standard_klines = None # 按需构建的标准K线对象
         self.fenxings = []        # 存储识别出的分型
         self.bis = []             # 存储最终生成的笔
 
+    @property
+    def raw_klines(self) -> List[ChanKLine]:
+        """原始K线对象列表（首次访问时构建）"""
+        if self._raw_klines is None:
+            columns = [pd.Series(self._dt).tolist()] + \
+                      [arr.tolist() for arr in (self._open, self._high, self._low, self._close, self._vol)]
+            self._raw_klines = [
+                ChanKLine(i, dt, o, h, l, c, v)
+                for i, (dt, o, h, l, c, v) in enumerate(zip(*columns))
+            ]
+            for k in self._raw_klines:
+                k.original_klines.append(k) # 原始K线由自身构成
+        return self._raw_klines
+
+    @property
+    def standard_klines(self) -> List[ChanKLine]:
+        """包含处理后的标准K线对象列表（首次访问时由 SoA 数组构建）"""
+        if self._standard_klines is None:
+            raw = self.raw_klines
+            n_std = len(self._std_orig_start)
+            if n_std == 0:
+                return []
+            # 合并K线的成交量为所含原始K线成交量之和
+            volumes = np.add.reduceat(self._vol, self._std_orig_start).tolist()
+            result = []
+            for start, end, high, low, volume in zip(self._std_orig_start.tolist(), self._std_orig_end.tolist(),
+                                                     self._std_high.tolist(), self._std_low.tolist(), volumes):
+                last = raw[end - 1]
+                if end - start == 1:
+                    # 未发生合并，直接沿用原始K线
+                    result.append(last)
+                    continue
+                # 时间沿用最后一根K线，开盘价取第一根，收盘价取最后一根
+                k = ChanKLine(
+                    index=last.index,
+                    datetime=last.datetime,
+                    open_price=raw[start].open,
+                    high=high,
+                    low=low,
+                    close=last.close,
+                    volume=volume,
+                    start_index=start,
+                    end_index=end - 1
+                )
+                # 构成的原始K线列表在首次访问时才切片生成
+                k._original_range = (self, start, end)
+                result.append(k)
+            self._standard_klines = result
+        return self._standard_klines
+
+    @property
+    def raw_to_std(self) -> np.ndarray:
+        """
+        原始K线位置到标准K线位置的映射数组（长度为原始K线数量）。
+        raw_to_std[k.index] 即原始K线 k 所在的标准K线在 standard_klines 中的位置，O(1) 查询，支持批量索引。
+        """
+        return self._raw_to_std
+
     def process_inclusion(self):
         """
         阶段 1: K线包含处理 (Step 1: K-line Inclusion Processing)
@@ -116,96 +386,13 @@ class ChanEngine:
            - 向上趋势（UP）：高点取较大值（High-High），低点取较大值（High-Low） -> GG-DG
            - 向下趋势（DOWN）：高点取较小值（Low-High），低点取较小值（Low-Low） -> GD-DD
         """
-        if not self.raw_klines:
-            return
+        self._standard_klines = None
 
-        # Start with the first two K-lines
-        processed = []
-        
-        # We need at least 2 K-lines to start
-        if len(self.raw_klines) < 2:
-            self.standard_klines = self.raw_klines
-            return
-
-        # Initialize with the first K-line
-        current_k = self.raw_klines[0]
-        processed.append(current_k)
-        
-        # 初始趋势判断
-        # 如果前两根K线就有包含关系，通常需要参考前一个趋势，或者默认。
-        # 这里简化处理：默认向上。在循环中会动态判断。
-        last_direction = Direction.UP 
-        
-        # 重构后的包含处理逻辑：
-        # 维护一个结果列表 result，每次拿新的 raw_kline 与 result[-1] 比较
-        
-        result = [self.raw_klines[0]]
-        
-        for i in range(1, len(self.raw_klines)):
-            next_k = self.raw_klines[i]
-            last_k = result[-1]
-            
-            # Check inclusion / 检查包含关系
-            is_included = False
-            
-            # Case 1: last_k contains next_k (左包右)
-            if last_k.high >= next_k.high and last_k.low <= next_k.low:
-                is_included = True
-            # Case 2: next_k contains last_k (右包左)
-            elif next_k.high >= last_k.high and next_k.low <= last_k.low:
-                is_included = True
-                
-            if is_included:
-                # 存在包含关系，需要合并。
-                # 首先确定当前的临时趋势方向，用于决定合并方式。
-                # 趋势方向由 last_k 和 result[-2] 的高点关系决定。
-                
-                current_direction = Direction.UP
-                if len(result) >= 2:
-                    prev_k = result[-2]
-                    if last_k.high > prev_k.high:
-                        current_direction = Direction.UP
-                    elif last_k.high < prev_k.high:
-                        current_direction = Direction.DOWN
-                    # If equal, keep previous direction (omitted for simplicity, assume UP or keep)
-                else:
-                     # 对于第一对K线，无法参考前值，默认向上
-                     pass
-                     
-                # Merge / 合并处理
-                new_high = 0.0
-                new_low = 0.0
-                
-                if current_direction == Direction.UP:
-                    # 向上趋势：取高点中的最大值，低点中的最大值 (GG-DG)
-                    new_high = max(last_k.high, next_k.high)
-                    new_low = max(last_k.low, next_k.low)
-                else:
-                    # 向下趋势：取高点中的最小值，低点中的最小值 (GD-DD)
-                    new_high = min(last_k.high, next_k.high)
-                    new_low = min(last_k.low, next_k.low)
-                
-                # 创建新的合并后K线
-                # 时间通常沿用后一根K线的时间（next_k），因为它代表了这段时间的最终状态
-                merged_k = ChanKLine(
-                    index=next_k.index, # Use the later index
-                    datetime=next_k.datetime,
-                    open_price=last_k.open, # 开盘价参考前一根（视觉上）
-                    high=new_high,
-                    low=new_low,
-                    close=next_k.close,
-                    volume=last_k.volume + next_k.volume,
-                    original_klines=last_k.original_klines + next_k.original_klines
-                )
-                
-                # Replace the last one in result with this merged one / 用合并后的K线替换列表末尾元素
-                result[-1] = merged_k
-                
-            else:
-                # No inclusion, just append / 无包含关系，直接加入结果列表
-                result.append(next_k)
-                
-        self.standard_klines = result
+        self._std_high, self._std_low, self._std_orig_start, self._std_orig_end = \
+            _process_inclusion_nb(self._high, self._low)
+        # 每根标准K线覆盖的原始K线区间是连续的，按区间长度重复标准K线序号即得映射
+        self._raw_to_std = np.repeat(np.arange(len(self._std_high), dtype=np.int64),
+                                     self._std_orig_end - self._std_orig_start)
 
     def find_fenxing(self):
         """
@@ -215,34 +402,17 @@ class ChanEngine:
         顶分型：中间K线高点最高，低点最高。
         底分型：中间K线高点最低，低点最低。
         """
-        self.fenxings = []
-        if len(self.standard_klines) < 3:
-            return
-
-        # 遍历标准K线，窗口大小为3
-        i = 1
-        while i < len(self.standard_klines) - 1:
-            k1 = self.standard_klines[i-1]
-            k2 = self.standard_klines[i]
-            k3 = self.standard_klines[i+1]
-            
-            # Top Fenxing: k2 high is highest, k2 low is highest / 顶分型判断
-            is_top = (k2.high > k1.high and k2.high > k3.high) and \
-                     (k2.low > k1.low and k2.low > k3.low)
-                     
-            # Bottom Fenxing: k2 high is lowest, k2 low is lowest / 底分型判断
-            is_bottom = (k2.high < k1.high and k2.high < k3.high) and \
-                        (k2.low < k1.low and k2.low < k3.low)
-            
-            if is_top:
-                self.fenxings.append(FenXing(k2, FenXingType.TOP))
-                # 这里我们先找出所有可能的物理分型，后续在画笔阶段（Step 3）进行严格过滤
-            
-            if is_bottom:
-                self.fenxings.append(FenXing(k2, FenXingType.BOTTOM))
-                
-            i += 1
-            
+        # 分型识别与画笔在同一次扫描中完成，笔的结果暂存，由 draw_bi 发布
+        self._fx_idx, self._fx_type, self._bi_start, self._bi_end = \
+            _fenxing_bi_nb(self._std_high, self._std_low)
+
+        # 这里保留所有可能的物理分型，画笔阶段（Step 3）的严格过滤已在内核中完成
+        std = self.standard_klines
+        self.fenxings = [
+            FenXing(std[i], FenXingType.TOP if t == FenXingType.TOP.value else FenXingType.BOTTOM, std_idx=i)
+            for i, t in zip(self._fx_idx.tolist(), self._fx_type.tolist())
+        ]
+
     def draw_bi(self):
         """
         阶段 3: 笔的绘制 (Step 3: Draw Bi / Stroke)
@@ -257,77 +427,6 @@ class ChanEngine:
            - 如果遇到同向分型且更极端（如顶更高），则更新起点。
            - 如果距离不足（违反5K原则），则跳过该候选终点，继续寻找。
         """
-        self.bis = []
-        if not self.fenxings:
-            return
-
-        # 当前笔的起点候选
-        current_bi_start = self.fenxings[0]
-        
-        # 辅助函数：获取分型在标准K线列表中的索引
-        def get_std_index(fx):
-            return self.standard_klines.index(fx.k_line)
-
-        i = 1
-        while i < len(self.fenxings):
-            next_fx = self.fenxings[i]
-            
-            # 1. Check if same type (Extension / Update Start)
-            # 如果下一个分型类型与当前起点相同（例如都是顶分型）
-            if next_fx.type == current_bi_start.type:
-                # 如果我们找到了一个更极端的点，就更新起点
-                # Top: Higher is better. Bottom: Lower is better.
-                update_start = False
-                if current_bi_start.type == FenXingType.TOP:
-                    if next_fx.high >= current_bi_start.high: # Allow equal to move forward
-                        update_start = True
-                else: # BOTTOM
-                    if next_fx.low <= current_bi_start.low:
-                        update_start = True
-                
-                if update_start:
-                    current_bi_start = next_fx
-                    # 如果这个点已经是上一笔的终点，我们需要更新上一笔的终点到这个新位置
-                    if self.bis:
-                        prev_bi_start = self.bis[-1].start_fx
-                        # 更新上一笔
-                        self.bis[-1] = Bi(prev_bi_start, next_fx)
-                
-                i += 1
-                continue
-                
-            # 2. Different Type: Candidate for Bi / 类型不同，可能是笔的终点
-            start_idx = get_std_index(current_bi_start)
-            end_idx = get_std_index(next_fx)
-            
-            # A. 5K Principle (Index Difference >= 4) / 5K原则检查
-            # Top(i) ... Bottom(i+4) -> 中间隔了3根K线，总共涉及5根K线
-            has_enough_bars = (end_idx - start_idx) >= 4
-            
-            # B. Value Check (Strict) / 数值力度检查
-            # 向下笔: 顶必须高于底
-            # 向上笔: 底必须低于顶
-            value_check = False
-            if current_bi_start.type == FenXingType.TOP:
-                if current_bi_start.high > next_fx.high and current_bi_start.low > next_fx.low:
-                    value_check = True
-            else:
-                if current_bi_start.low < next_fx.low and current_bi_start.high < next_fx.high:
-                    value_check = True
-            
-            if has_enough_bars and value_check:
-                # VALID BI FOUND / 找到有效笔
-                new_bi = Bi(current_bi_start, next_fx)
-                self.bis.append(new_bi)
-                
-                # Update start to this new end / 将当前终点设为下一笔的起点
-                current_bi_start = next_fx
-                
-                # Move to next
-                i += 1
-            else:
-                # INVALID BI / 无效笔
-                # 忽略这个 next_fx，继续往后找。
-                # 此时保留 current_bi_start 不变。
-                i += 1
-
+        # 笔的端点已由 find_fenxing 中的融合内核算出，这里只构建 Bi 对象
+        fx = self.fenxings
+        self.bis = [Bi(fx[start], fx[end]) for start, end in zip(self._bi_start.tolist(), self._bi_end.tolist())]
@@ -7,6 +7,30 @@ from data_fetcher import fetch_csi300_data, get_stock_name
 from chan_core import ChanEngine
 from visualizer import plot_chan
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from concurrent.futures import ThreadPoolExecutor
+import queue
+
+def _fetch_name(symbol):
+    """后台线程任务：查询名称（best effort），查询失败返回 None"""
+    try:
+        stock_name = get_stock_name(symbol)
+    except Exception:
+        return None
+    return stock_name if stock_name != symbol else None
+
+def _compute_one(df):
+    """对数据执行包含处理、分型识别与画笔"""
+    engine = ChanEngine(df)
+    engine.process_inclusion()
+    engine.find_fenxing()
+    engine.draw_bi()
+    return engine
+
+def _run_one(symbol, period, start_full, end_full):
+    """后台线程任务：获取数据并完成缠论计算"""
+    df = fetch_csi300_data(period=period, start_date=start_full, end_date=end_full, symbol=symbol)
+    engine = _compute_one(df) if not df.empty else None
+    return df, engine
 
 class DateSelector(ttk.Frame):
     def __init__(self, parent, label_text, default_date=None):
@@ -35,11 +59,9 @@ class DateSelector(ttk.Frame):
         self.day_cb = ttk.Combobox(self, textvariable=self.day_var, width=3, values=[f"{d:02d}" for d in range(1, 32)])
         self.day_cb.pack(side=tk.LEFT, padx=2)
         
-    def get_date_str(self):
-        y = self.year_var.get()
-        m = self.month_var.get()
-        d = self.day_var.get()
-        return f"{y}-{m}-{d}"
+    def get_date(self):
+        """直接由下拉框的数值构造 datetime，无效日期（如 02-30）抛出 ValueError"""
+        return datetime(int(self.year_var.get()), int(self.month_var.get()), int(self.day_var.get()))
 
 class CustomRunnerGUI:
     def __init__(self, root):
@@ -53,7 +75,7 @@ class CustomRunnerGUI:
         
         ttk.Label(frame_period, text="Symbol:").pack(side=tk.LEFT, padx=5)
         self.symbol_var = tk.StringVar(value="000300")
-        symbol_entry = ttk.Entry(frame_period, textvariable=self.symbol_var, width=8)
+        symbol_entry = ttk.Entry(frame_period, textvariable=self.symbol_var, width=16)
         symbol_entry.pack(side=tk.LEFT, padx=5)
         
         ttk.Label(frame_period, text="K-Line Period:").pack(side=tk.LEFT, padx=5)
@@ -82,74 +104,116 @@ class CustomRunnerGUI:
         # Status
         self.status_var = tk.StringVar(value="Ready")
         ttk.Label(root, textvariable=self.status_var, foreground="blue").pack(side=tk.BOTTOM, pady=5)
+        
+        # Background workers for fetching & computing
+        self.executor = ThreadPoolExecutor(max_workers=8)
+        self.pending_count = 0
+        
+        # 后台线程 -> 主线程的消息队列：完成回调在工作线程中执行，不能直接调用 Tk，由定时器统一取出处理
+        # 消息为 (处理函数, 参数元组)
+        self.ui_queue = queue.Queue()
+        self._drain_queue()
+        
+        # 关闭窗口时停止线程池，取消尚未开始的任务
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def run_task(self):
-        symbol = self.symbol_var.get().strip()
+        # 支持以逗号分隔输入多个代码
+        symbols = [s.strip() for s in self.symbol_var.get().replace('，', ',').split(',') if s.strip()]
         period = self.period_var.get()
-        start_str = self.start_selector.get_date_str()
-        end_str = self.end_selector.get_date_str()
         
-        if not symbol:
+        if not symbols:
             messagebox.showerror("Error", "Please enter a stock symbol.")
             return
         
         # Validate dates
         try:
-            s_dt = datetime.strptime(start_str, "%Y-%m-%d")
-            e_dt = datetime.strptime(end_str, "%Y-%m-%d")
-            if s_dt > e_dt:
-                messagebox.showerror("Error", "Start date must be before end date.")
-                return
+            s_dt = self.start_selector.get_date()
+            e_dt = self.end_selector.get_date()
         except ValueError:
             messagebox.showerror("Error", "Invalid date.")
             return
+        if s_dt > e_dt:
+            messagebox.showerror("Error", "Start date must be before end date.")
+            return
 
         # Add time suffix
+        start_str = s_dt.strftime('%Y-%m-%d')
+        end_str = e_dt.strftime('%Y-%m-%d')
         start_full = f"{start_str} 00:00:00"
         end_full = f"{end_str} 23:59:59"
         
         period_display = f"{period}min" if period != 'daily' else "daily"
-        self.status_var.set(f"Fetching {symbol} {period_display} data from {start_str} to {end_str}...")
-        self.root.update()
-        
+        self.status_var.set(f"Fetching {', '.join(symbols)} {period_display} data from {start_str} to {end_str}...")
+        self.pending_count += len(symbols)
+        
+        # 数据获取（网络 I/O）与缠论计算在线程池中执行，不阻塞界面；多个标的并行处理
+        # 名称单独查询：数据先出图，名称到达后再补上标题
+        for symbol in symbols:
+            name_future = self.executor.submit(_fetch_name, symbol)
+            future = self.executor.submit(_run_one, symbol, period, start_full, end_full)
+            future.add_done_callback(
+                lambda f, sym=symbol, nf=name_future:
+                    self.ui_queue.put((self.on_task_done, (f, nf, sym, period, start_str, end_str)))
+            )
+
+    def _drain_queue(self):
+        """主线程定时器：每 50ms 取出已完成的任务并处理"""
+        try:
+            while True:
+                handler, args = self.ui_queue.get_nowait()
+                handler(*args)
+        except queue.Empty:
+            pass
+        self.root.after(50, self._drain_queue)
+
+    def on_close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
+
+    def on_task_done(self, future, name_future, symbol, period, start_str, end_str):
+        # This is called in main thread
+        self.pending_count -= 1
         try:
-            df = fetch_csi300_data(period=period, start_date=start_full, end_date=end_full, symbol=symbol)
+            df, engine = future.result()
             
             if df.empty:
                 self.status_var.set("Error: No data fetched.")
                 messagebox.showwarning("No Data", f"No data returned for {symbol} in this range.\nNote: 1-min data availability might be limited to recent history.\n\nRange: {start_str} to {end_str}")
                 return
-                
-            self.status_var.set(f"Fetched {len(df)} records. Processing...")
-            self.root.update()
-            
-            # Chan Engine
-            engine = ChanEngine(df)
-            engine.process_inclusion()
-            engine.find_fenxing()
-            engine.draw_bi()
-            
-            # Get Stock Name
-            try:
-                stock_name = get_stock_name(symbol)
-            except:
-                stock_name = None
-
-            # Show Plot
-            self.show_plot_window(df, engine, period, symbol, stock_name)
-            self.status_var.set("Done.")
+
+            # Show Plot：名称已查到则直接使用，否则先不带名称显示
+            name_done = name_future.done()
+            stock_name = name_future.result() if name_done else None
+            top, canvas = self.show_plot_window(df, engine, period, symbol, stock_name)
+            if not name_done:
+                name_future.add_done_callback(
+                    lambda nf: self.ui_queue.put((self.on_name_ready, (nf, top, canvas, df, engine, period, symbol)))
+                )
+            if self.pending_count == 0:
+                self.status_var.set("Done.")
             
         except Exception as e:
             self.status_var.set("Error occurred.")
-            messagebox.showerror("Exception", str(e))
+            messagebox.showerror("Exception", f"{symbol}: {e}")
 
-    def show_plot_window(self, df, engine, period, stock_code, stock_name):
-        top = tk.Toplevel(self.root)
-        
+    def on_name_ready(self, name_future, top, canvas, df, engine, period, symbol):
+        """名称晚于数据到达：窗口仍在时更新窗口标题并在原 Figure 上重画"""
+        stock_name = name_future.result()
+        if not stock_name or not top.winfo_exists():
+            return
+        self._set_window_title(top, period, symbol, stock_name)
+        plot_chan(df, engine, period=period, stock_code=symbol, stock_name=stock_name, return_figure=True, fig=canvas.figure)
+        canvas.draw_idle()
+
+    def _set_window_title(self, top, period, stock_code, stock_name):
         period_str = f"{period} Min" if period != 'daily' else "Daily"
-        
         title_part = f"{stock_name} {stock_code}" if stock_name else stock_code
         top.title(f"Chan Chart - {title_part} {period_str}")
+
+    def show_plot_window(self, df, engine, period, stock_code, stock_name):
+        top = tk.Toplevel(self.root)
+        self._set_window_title(top, period, stock_code, stock_name)
         top.geometry("1200x800")
         
         fig = plot_chan(df, engine, period=period, stock_code=stock_code, stock_name=stock_name, return_figure=True)
@@ -157,6 +221,9 @@ class CustomRunnerGUI:
         canvas = FigureCanvasTkAgg(fig, master=top)
         canvas.draw()
         canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        # 窗口关闭时释放 Figure（plot_chan 通过 pyplot 创建，否则会一直留在 pyplot 的注册表中）
+        top.bind('<Destroy>', lambda event: plt.close(fig) if event.widget is top else None)
+        return top, canvas
 
 def main():
     root = tk.Tk()
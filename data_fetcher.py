@@ -1,11 +1,70 @@
 import akshare as ak
+import atexit
+import json
+import numpy as np
 import pandas as pd
+import requests
 from datetime import datetime, timedelta
-import threading
+from pathlib import Path
+import time
+from functools import lru_cache, cache
 
-# Global cache for stock names
-_stock_names_cache = {}
-_cache_lock = threading.Lock()
+try:
+    import pyarrow  # noqa: F401  Parquet 读写依赖
+    _PARQUET_AVAILABLE = True
+except ImportError:
+    _PARQUET_AVAILABLE = False
+
+try:
+    import polars as pl
+    _POLARS_AVAILABLE = True
+except ImportError:
+    _POLARS_AVAILABLE = False
+
+# 本地行情缓存目录
+_CACHE_DIR = Path('~/.chantheory_cache').expanduser()
+
+# 当天（未收盘）数据的缓存有效期（秒）：分钟线变化快，日线的当天 K 线也会随盘中更新
+_LIVE_TILE_TTL = {'daily': 600}
+_LIVE_TILE_TTL_DEFAULT = 60
+
+# AkShare 请求失败时可能抛出的异常（网络错误、返回数据格式异常等）。
+# 不使用裸 except，以免吞掉 KeyboardInterrupt / SystemExit，导致无法中断卡住的请求。
+# TypeError 也在其中：代码不存在时 AkShare 常在解析空响应时抛出 TypeError。
+_AKSHARE_ERRORS = (requests.RequestException, ValueError, KeyError, IndexError, TypeError)
+
+# 美股代码 -> 东方财富交易所前缀（105./106./107.）：首次探测成功后记住，之后直接请求正确的代码
+_US_PREFIXES = ("105.", "106.", "107.")
+_US_PREFIX_PATH = _CACHE_DIR / 'us_prefix.json'
+try:
+    _US_PREFIX_CACHE = json.loads(_US_PREFIX_PATH.read_text(encoding='utf-8'))
+except (OSError, ValueError):
+    _US_PREFIX_CACHE = {}
+
+@atexit.register
+def _save_us_prefix_cache():
+    """退出时保存前缀表，下次启动仍可直接命中"""
+    if not _US_PREFIX_CACHE:
+        return
+    try:
+        _US_PREFIX_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _US_PREFIX_PATH.write_text(json.dumps(_US_PREFIX_CACHE), encoding='utf-8')
+    except OSError as e:
+        print(f"Warning: Failed to save US prefix cache: {e}")
+
+def _us_prefix_order(symbol):
+    """已知前缀优先尝试，其余作为后备"""
+    known = _US_PREFIX_CACHE.get(symbol)
+    if known is None:
+        return _US_PREFIXES
+    return (known,) + tuple(p for p in _US_PREFIXES if p != known)
+
+# 输出列的类型：价格保持 float64（float32 在 13 万以上已无法表示到分），成交量 int64；datetime 保持 datetime64
+_OUTPUT_DTYPES = {'open': 'float64', 'high': 'float64', 'low': 'float64', 'close': 'float64', 'volume': 'int64'}
+
+# 已知指数代码与 A 股交易所前缀，模块级常量避免每次调用重复构建
+_KNOWN_INDICES = frozenset({'000300', '000001', '399001', '000905', '000016', '399006'})
+_CN_PREFIXES = ('SH', 'SZ', 'BJ')
 
 def detect_market(symbol):
     """
@@ -14,102 +73,247 @@ def detect_market(symbol):
     """
     symbol = str(symbol).strip().upper()
     
-    known_indices = ['000300', '000001', '399001', '000905', '000016', '399006'] 
-    
     if symbol.endswith('.HK'):
         return 'HK', symbol[:-3]
     if symbol.endswith('.US'):
         return 'US', symbol[:-3]
         
-    if symbol in known_indices:
+    if symbol in _KNOWN_INDICES:
         return 'INDEX', symbol
         
     if len(symbol) == 5 and symbol.isdigit():
         return 'HK', symbol
         
-    if any(c.isalpha() for c in symbol) and not (symbol.startswith('SH') or symbol.startswith('SZ') or symbol.startswith('BJ')):
+    # 含字母（非纯数字）且不是 SH/SZ/BJ 前缀的视为美股；空字符串保持原先的 'A'
+    if symbol and not symbol.isdigit() and not symbol.startswith(_CN_PREFIXES):
         return 'US', symbol
         
     return 'A', symbol
 
+@cache
+def _load_hk_name_map():
+    """港股列表只拉取一次（约 3000 行），转为 代码 -> 名称 字典后丢弃 DataFrame"""
+    print("Fetching HK stock list for names...")
+    hk_list = ak.stock_hk_spot_em()
+    # hk_list columns: 序号, 代码, 名称, ...
+    return dict(zip(hk_list['代码'].astype(str), hk_list['名称']))
+
 def get_stock_name(symbol):
     """
-    Get stock name. Tries to fetch from AkShare if not in cache.
+    Get stock name. 查询失败时返回代码本身；失败的结果不进缓存，下次调用会重试。
     """
     symbol = str(symbol).strip().upper()
-    
-    with _cache_lock:
-        if symbol in _stock_names_cache:
-            return _stock_names_cache[symbol]
-    
-    market, clean_symbol = detect_market(symbol)
-    name = symbol # Default to symbol
-    
     try:
-        if market == 'A':
-            # Try specific A-share lookup first (fast)
-            try:
-                # stock_individual_info_em is fast but might not work for all
-                # But stock_zh_a_spot_em is heavy.
-                # Let's try individual info first?
-                # Actually stock_individual_info_em returns a dataframe with fields.
-                # It requires symbol like "600519".
-                df = ak.stock_individual_info_em(symbol=clean_symbol)
-                # Field: 股票简称
-                if not df.empty:
-                    # df structure: item, value
-                    name_row = df[df['item'] == '股票简称']
-                    if not name_row.empty:
-                        name = name_row['value'].values[0]
-            except:
-                pass
-                
-        elif market == 'HK':
-            # HK spot is relatively small (~3000 rows)
-            # We can cache the whole list once?
-            # Or just return symbol for now if it's too slow.
-            # Let's try to fetch spot once.
-            global _hk_list_cache
-            if '_hk_list_cache' not in globals():
-                print("Fetching HK stock list for names...")
-                _hk_list_cache = ak.stock_hk_spot_em()
-            
-            # _hk_list_cache columns: 序号, 代码, 名称, ...
-            # Code is 5 digits usually.
-            row = _hk_list_cache[_hk_list_cache['代码'] == clean_symbol]
-            if not row.empty:
-                name = row['名称'].values[0]
-                
-        elif market == 'US':
-            # US list is huge. Maybe just use symbol.
-            # Or try stock_us_spot_em()
-            pass
-            
+        return _resolve_name(symbol)
     except Exception as e:
         print(f"Error fetching name for {symbol}: {e}")
-        
-    with _cache_lock:
-        _stock_names_cache[symbol] = name
-        
-    return name
+        return symbol
+
+@lru_cache(maxsize=4096)
+def _resolve_name(symbol):
+    """
+    从 AkShare 查询名称，按代码缓存成功的结果；查询失败时抛出异常，使 lru_cache 不缓存。
+    """
+    market, clean_symbol = detect_market(symbol)
+
+    if market == 'A':
+        # 按代码单独查询个股信息：全市场快照要分页请求几十次，首次查询需约一分钟
+        info = ak.stock_individual_info_em(symbol=clean_symbol)
+        # df structure: item, value；字段 股票简称
+        name_row = info[info['item'] == '股票简称']
+        return name_row['value'].iat[0] if not name_row.empty else symbol
+    if market == 'HK':
+        # HK spot is relatively small (~3000 rows)
+        return _load_hk_name_map().get(clean_symbol, symbol)
+    # US list is huge. Just use symbol.
+    return symbol
 
 def fetch_csi300_data(period='15', days=60, start_date=None, end_date=None, symbol='000300'):
     """
     Fetch market data using AkShare.
+    已收盘交易日的数据会缓存为本地 Parquet 分片，重复查询时只请求缺失的部分；
+    相同参数的重复调用直接命中进程内的 LRU 缓存。
+    返回的 DataFrame 按 datetime 升序排列。
     """
+    now = datetime.now()
     # Calculate start date if not provided
-    if start_date is None:
-        start_dt = datetime.now() - timedelta(days=int(days * 1.5)) 
-        start_date_str = start_dt.strftime('%Y-%m-%d %H:%M:%S')
-    else:
-        start_date_str = start_date
-        
-    # Prepare end_date string if provided
-    end_date_str = end_date if end_date else datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    # 参数统一规范为 'YYYY-mm-dd HH:MM:SS'；默认值按分钟取整，使连续调用能命中缓存
+    # 无法解析的日期与原先一样返回空 DataFrame，不向调用方抛出
+    try:
+        if start_date is None:
+            start_dt = now - timedelta(days=int(days * 1.5)) 
+            start_date_str = start_dt.strftime('%Y-%m-%d %H:%M:00')
+        else:
+            start_date_str = pd.Timestamp(start_date).strftime('%Y-%m-%d %H:%M:%S')
+            
+        # Prepare end_date string if provided
+        if end_date:
+            end_date_str = pd.Timestamp(end_date).strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            end_date_str = now.strftime('%Y-%m-%d %H:%M:00')
+    except (ValueError, TypeError) as e:
+        print(f"Error fetching data: invalid date range ({start_date}, {end_date}): {e}")
+        return pd.DataFrame()
     
     # Clean symbol
     symbol = str(symbol).strip()
 
+    # 包含今天的请求数据仍在变化：缓存键附带当前分钟，最多复用一分钟；历史区间则一直有效
+    live_bucket = now.strftime('%Y%m%d%H%M') if end_date_str >= now.strftime('%Y-%m-%d') else None
+    try:
+        df = _fetch_cached(symbol, period, start_date_str, end_date_str, live_bucket)
+    except _EmptyResult:
+        return pd.DataFrame()
+    # 返回副本：缓存中的 DataFrame 由所有相同参数的调用共享，调用方的任何修改都不能影响缓存
+    return df.copy()
+
+class _EmptyResult(Exception):
+    """获取结果为空；以异常形式返回，使 lru_cache 不缓存失败的请求"""
+
+@lru_cache(maxsize=8)
+def _fetch_cached(symbol, period, start_date_str, end_date_str, live_bucket):
+    # 个股/港美股为前复权数据，除权后历史价格会整体变化，不能长期缓存；只有指数走分片缓存
+    if _PARQUET_AVAILABLE and detect_market(symbol)[0] == 'INDEX':
+        df = _fetch_with_tile_cache(symbol, period, start_date_str, end_date_str)
+    else:
+        df = _fetch_remote(symbol, period, start_date_str, end_date_str)
+    if df.empty:
+        raise _EmptyResult()
+    return df
+
+def _tile_path(symbol, period, day):
+    """缓存分片路径：{symbol}_{period}_{YYYYMMDD}.parquet"""
+    return _CACHE_DIR / f"{symbol.upper()}_{period}_{day.strftime('%Y%m%d')}.parquet"
+
+def _live_tile_path(symbol, period, day):
+    """当天未收盘数据的短期缓存，与已完成的分片分开命名，过期后不会被当作完整数据"""
+    return _CACHE_DIR / f"{symbol.upper()}_{period}_{day.strftime('%Y%m%d')}.live.parquet"
+
+def _fetch_with_tile_cache(symbol, period, start_date_str, end_date_str):
+    """
+    按天分片的 Parquet 缓存（仅用于不复权的指数数据）。
+    从第一个缺失分片的零点开始向 AkShare 请求到 end_date（需要写分片时至少请求到该日结束），
+    并把今天之前（数据已完整）的每一天写回缓存；
+    没有数据的日期（周末、节假日）写入空分片，避免重复请求。
+    当天的数据另存为短期分片，在 _LIVE_TILE_TTL 内重复查询直接读取本地文件。
+    """
+    start_ts = pd.Timestamp(start_date_str)
+    end_ts = pd.Timestamp(end_date_str)
+    today = pd.Timestamp.now().normalize()
+
+    # 只有今天之前的交易日数据是完整的，可以缓存
+    cache_days = pd.date_range(start_ts.normalize(), min(end_ts.normalize(), today - pd.Timedelta(days=1)), freq='D')
+    tile_paths = [_tile_path(symbol, period, day) for day in cache_days]
+
+    n_hit = 0
+    while n_hit < len(tile_paths) and tile_paths[n_hit].exists():
+        n_hit += 1
+
+    frames = []
+    try:
+        frames = [pd.read_parquet(path) for path in tile_paths[:n_hit]]
+    except (OSError, ValueError) as e:
+        print(f"Warning: Failed to read cache for {symbol}: {e}")
+        n_hit = 0
+
+    if n_hit > 0:
+        print(f"Loaded {n_hit} cached day(s) for {symbol} {period}.")
+
+    # 剩余部分：第一个缺失的分片（或今天）到 end_date
+    # 有分片要写时必须覆盖完整的天：从该日零点开始，并至少请求到最后一个分片日的结束
+    if n_hit < len(cache_days):
+        fetch_start = cache_days[n_hit]
+        fetch_end = max(end_ts, cache_days[-1] + pd.Timedelta(days=1) - pd.Timedelta(seconds=1))
+    else:
+        fetch_start = max(today, start_ts)
+        fetch_end = end_ts
+    if fetch_start <= end_ts:
+        live_path = _live_tile_path(symbol, period, today)
+        ttl = _LIVE_TILE_TTL.get(period, _LIVE_TILE_TTL_DEFAULT)
+        fetched = None
+        if fetch_start >= today:
+            try:
+                if time.time() - live_path.stat().st_mtime < ttl:
+                    fetched = pd.read_parquet(live_path)
+                    print(f"Loaded today's cached data for {symbol} {period}.")
+            except (OSError, ValueError):
+                fetched = None
+
+        if fetched is None:
+            fetched = _fetch_remote(symbol, period, fetch_start.strftime('%Y-%m-%d %H:%M:%S'), fetch_end.strftime('%Y-%m-%d %H:%M:%S'))
+            if not fetched.empty:
+                _write_tiles(fetched, symbol, period, cache_days[n_hit:])
+                # 只有从当天零点（或更早）开始、且请求到当前时刻的结果才包含当天已有的全部数据，可作为短期缓存
+                if fetch_start <= today and end_ts >= pd.Timestamp.now().floor('min'):
+                    _write_live_tile(fetched[fetched['datetime'] >= today], live_path, symbol)
+        if not fetched.empty:
+            frames.append(fetched)
+
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+
+    # 分片包含整天的数据，按请求的时间范围截取（日线的时间戳为当天零点，按日期比较）
+    df = pd.concat(frames, ignore_index=True).astype(_OUTPUT_DTYPES)
+    lower = start_ts.normalize() if period == 'daily' else start_ts
+    df = df[(df['datetime'] >= lower) & (df['datetime'] <= end_ts)]
+    return df.reset_index(drop=True)
+
+def _write_tiles(df, symbol, period, days):
+    """把 df 按天拆分写入缓存分片"""
+    if len(days) == 0:
+        return
+    try:
+        _CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        groups = dict(list(df.groupby(df['datetime'].dt.normalize())))
+        for day in days:
+            tile = groups.get(day, df.iloc[0:0])
+            tile.reset_index(drop=True).to_parquet(_tile_path(symbol, period, day), compression='zstd')
+    except (OSError, ValueError) as e:
+        print(f"Warning: Failed to write cache for {symbol}: {e}")
+
+def _write_live_tile(df, path, symbol):
+    """写入当天的短期缓存分片"""
+    if df.empty:
+        return
+    try:
+        _CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        df.reset_index(drop=True).to_parquet(path, compression='zstd')
+    except (OSError, ValueError) as e:
+        print(f"Warning: Failed to write cache for {symbol}: {e}")
+
+def _resample_minutes(df, period):
+    """
+    将 AkShare 的 1 分钟数据（中文列名）聚合为 period 分钟 K 线。
+    安装了 polars 时走多线程的 group_by_dynamic，否则回退到 pandas resample。
+    """
+    minutes = int(period) if period in ['5', '15', '30', '60'] else 1
+    df = df.assign(时间=pd.to_datetime(df['时间']))
+    
+    if _POLARS_AVAILABLE:
+        out = (
+            pl.from_pandas(df[['时间', '开盘', '最高', '最低', '收盘', '成交量']])
+            .lazy()
+            .sort('时间')
+            .group_by_dynamic('时间', every=f"{minutes}m", closed='left')
+            .agg([
+                pl.col('开盘').first(), pl.col('最高').max(), pl.col('最低').min(),
+                pl.col('收盘').last(), pl.col('成交量').sum()
+            ])
+            .drop_nulls()
+            .collect()
+        )
+        return out.to_pandas()
+    
+    df_resampled = df.set_index('时间').resample(f"{minutes}min").agg({
+        '开盘': 'first', '最高': 'max', '最低': 'min', '收盘': 'last', '成交量': 'sum'
+    })
+    return df_resampled.dropna().reset_index()
+
+def _fetch_remote(symbol, period, start_date_str, end_date_str):
+    """
+    从 AkShare 获取数据并清洗为 datetime, open, high, low, close, volume 格式。
+    """
     print(f"Fetching data for {symbol} from AkShare (Start: {start_date_str}, End: {end_date_str})...")
     
     try:
@@ -131,41 +335,36 @@ def fetch_csi300_data(period='15', days=60, start_date=None, end_date=None, symb
             print(f"Detected US Stock: {clean_symbol}")
             
             if period == 'daily':
-                prefixes = ["105.", "106.", "107."]
                 s_d = start_date_str.split(' ')[0].replace('-', '')
                 e_d = end_date_str.split(' ')[0].replace('-', '')
                 
-                for prefix in prefixes:
+                for prefix in _us_prefix_order(clean_symbol):
                     try:
                         code = f"{prefix}{clean_symbol}"
                         print(f"Trying {code}...")
                         df = ak.stock_us_hist(symbol=code, period="daily", start_date=s_d, end_date=e_d, adjust="qfq")
                         if not df.empty:
+                            _US_PREFIX_CACHE[clean_symbol] = prefix
                             break
-                    except:
+                    except _AKSHARE_ERRORS as e:
+                        print(f"{code} failed: {e}")
                         continue
             else:
-                prefixes = ["105.", "106.", "107."]
-                for prefix in prefixes:
+                for prefix in _us_prefix_order(clean_symbol):
                     try:
                         code = f"{prefix}{clean_symbol}"
                         print(f"Trying {code}...")
                         df = ak.stock_us_hist_min_em(symbol=code, start_date=start_date_str, end_date=end_date_str)
                         if not df.empty:
+                            _US_PREFIX_CACHE[clean_symbol] = prefix
                             break
-                    except:
+                    except _AKSHARE_ERRORS as e:
+                        print(f"{code} failed: {e}")
                         continue
                 
                 if not df.empty and period != '1':
                     print(f"Resampling US 1-min data to {period}-min...")
-                    df['时间'] = pd.to_datetime(df['时间'])
-                    df.set_index('时间', inplace=True)
-                    freq_map = {'5': '5min', '15': '15min', '30': '30min', '60': '60min'}
-                    freq = freq_map.get(period, '1min')
-                    df_resampled = df.resample(freq).agg({
-                        '开盘': 'first', '最高': 'max', '最低': 'min', '收盘': 'last', '成交量': 'sum'
-                    })
-                    df = df_resampled.dropna().reset_index()
+                    df = _resample_minutes(df, period)
         
         # --- A-Share Market / Index ---
         else: # market == 'A' or 'INDEX'
@@ -192,28 +391,45 @@ def fetch_csi300_data(period='15', days=60, start_date=None, end_date=None, symb
             print(f"Warning: AkShare returned empty DataFrame for start_date={start_date_str}")
             return pd.DataFrame()
             
-        rename_map = {
-            '时间': 'datetime', '日期': 'datetime',
-            '开盘': 'open', '最高': 'high', '最低': 'low', '收盘': 'close', '成交量': 'volume'
-        }
-        df = df.rename(columns=rename_map)
-        df = df[['datetime', 'open', 'high', 'low', 'close', 'volume']]
-        df['datetime'] = pd.to_datetime(df['datetime'])
+        # 直接用原始列的 NumPy 数组构建目标 DataFrame，避免 rename + 列选择产生中间副本
+        # 分钟数据的时间列为 '时间'，日线为 '日期'；均为 ISO 格式，指定 format 跳过格式推断
+        time_col = '时间' if '时间' in df.columns else '日期'
+        # 已是 datetime64（如重采样后的美股数据）时直接使用，否则解析字符串/日期对象
+        times = df[time_col].to_numpy()
+        if not np.issubdtype(times.dtype, np.datetime64):
+            times = pd.to_datetime(times, format='ISO8601', cache=True)
+        df = pd.DataFrame({
+            'datetime': times,
+            'open': df['开盘'].to_numpy(),
+            'high': df['最高'].to_numpy(),
+            'low': df['最低'].to_numpy(),
+            'close': df['收盘'].to_numpy(),
+            'volume': df['成交量'].to_numpy()
+        })
         
         numeric_cols = ['open', 'high', 'low', 'close', 'volume']
-        for col in numeric_cols:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+        df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce')
             
-        df = df.dropna(subset=['open', 'high', 'low', 'close'])
+        price_cols = ['open', 'high', 'low', 'close']
+        df = df.dropna(subset=price_cols)
         
-        cols_to_check = ['open', 'high', 'low', 'close']
-        for col in cols_to_check:
-            mask_zero = (df[col] <= 0)
-            if mask_zero.any():
-                print(f"Warning: Found {mask_zero.sum()} rows with {col} <= 0. Fixing by using Close value...")
-                df.loc[mask_zero, col] = df.loc[mask_zero, 'close']
-
-        df = df.sort_values('datetime').reset_index(drop=True)
+        # 价格 <= 0 的异常值用收盘价替换：在二维数组上一次性完成，避免逐列 .loc 赋值
+        prices = df[price_cols].to_numpy(dtype=float)
+        mask_zero = prices <= 0
+        if mask_zero.any():
+            counts = mask_zero.sum(axis=0)
+            summary = ', '.join(f"{col}: {n}" for col, n in zip(price_cols, counts) if n)
+            print(f"Warning: Found rows with price <= 0 ({summary}). Fixing by using Close value...")
+            df[price_cols] = np.where(mask_zero, prices[:, [3]], prices)
+
+        # 统一输出类型：成交量转为 int64
+        df['volume'] = df['volume'].fillna(0)
+        df = df.astype(_OUTPUT_DTYPES)
+
+        # AkShare 通常已按时间升序返回，仅在乱序时排序
+        if not df['datetime'].is_monotonic_increasing:
+            df = df.sort_values('datetime')
+        df = df.reset_index(drop=True)
         return df
         
     except Exception as e:
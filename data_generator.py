@@ -2,6 +2,15 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
+try:
+    import polars as pl
+    _POLARS_AVAILABLE = True
+except ImportError:
+    _POLARS_AVAILABLE = False
+
+FICTIONAL_PARQUET = 'csi300_15min_fictional.parquet'
+FICTIONAL_CSV = 'csi300_15min_fictional.csv'
+
 # =================================================================================================
 # 数据生成器 (Data Generator)
 #
@@ -22,69 +31,76 @@ def generate_csi300_data(start_date='2023-01-01', days=60):
     返回:
         pd.DataFrame: 包含 datetime, open, high, low, close, volume 的DataFrame
     """
-    np.random.seed(42)  # 固定随机种子，保证结果可复现 / For reproducibility
+    rng = np.random.default_rng(42)  # 固定随机种子，保证结果可复现 / For reproducibility
     
     start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-    data_list = []
-    
     current_price = 4000.0  # 沪深300初始点位 / Starting price for CSI 300
     
-    for i in range(days):
-        current_date = start_dt + timedelta(days=i)
-        
-        # Skip weekends / 跳过周末
-        if current_date.weekday() >= 5:
-            continue
-            
-        # Trading hours: 9:30-11:30, 13:00-15:00 / 交易时间段
-        morning_start = current_date.replace(hour=9, minute=30)
-        morning_end = current_date.replace(hour=11, minute=30)
-        afternoon_start = current_date.replace(hour=13, minute=0)
-        afternoon_end = current_date.replace(hour=15, minute=0)
-        
-        timestamps = []
-        curr = morning_start
-        while curr < morning_end:
-            timestamps.append(curr)
-            curr += timedelta(minutes=15)
-            
-        curr = afternoon_start
-        while curr < afternoon_end:
-            timestamps.append(curr)
-            curr += timedelta(minutes=15)
-            
-        for ts in timestamps:
-            # Simulate price movement (15 min volatility is higher than 1 min)
-            # 模拟价格变动：15分钟的波动率比1分钟大，这里放大波动
-            # Scaling volatility by approx sqrt(15) ~ 4
-            change = np.random.normal(0, 6.0) 
-            open_price = current_price
-            close_price = current_price + change
-            
-            # High and Low derived from Open and Close with some volatility
-            # 基于开收盘价增加随机波动生成最高/最低价
-            high_price = max(open_price, close_price) + abs(np.random.normal(0, 2.0))
-            low_price = min(open_price, close_price) - abs(np.random.normal(0, 2.0))
-            
-            # 模拟成交量
-            volume = int(np.random.exponential(150000)) # Higher volume for 15min
-            
-            data_list.append({
-                'datetime': ts,
-                'open': round(open_price, 2),
-                'high': round(high_price, 2),
-                'low': round(low_price, 2),
-                'close': round(close_price, 2),
-                'volume': volume
-            })
-            
-            current_price = close_price
+    # Skip weekends / 跳过周末：取起始日之后 days 个自然日中的工作日
+    trading_days = pd.bdate_range(start_dt, start_dt + timedelta(days=days - 1))
+    
+    # Trading hours: 9:30-11:30, 13:00-15:00 / 交易时间段，每 15 分钟一根
+    # 每天的K线时刻相同：日期 + 日内偏移，广播后展平即得全部时间戳
+    morning = pd.Timedelta(hours=9, minutes=30) + pd.to_timedelta(np.arange(0, 120, 15), unit='m')
+    afternoon = pd.Timedelta(hours=13) + pd.to_timedelta(np.arange(0, 120, 15), unit='m')
+    offsets = np.concatenate([morning.to_numpy(), afternoon.to_numpy()])
+    timestamps = (trading_days.to_numpy()[:, None] + offsets[None, :]).ravel()
+
+    # 一次性生成所有K线的随机数，整列计算价格 / Generate all bars at once with NumPy
+    n = len(timestamps)
+    
+    # Simulate price movement (15 min volatility is higher than 1 min)
+    # 模拟价格变动：15分钟的波动率比1分钟大，这里放大波动
+    # Scaling volatility by approx sqrt(15) ~ 4
+    changes = rng.normal(0, 6.0, n)
+    close_prices = current_price + np.cumsum(changes)
+    # 每根K线的开盘价为上一根的收盘价
+    open_prices = np.roll(close_prices, 1)
+    open_prices[:1] = current_price
+    
+    # High and Low derived from Open and Close with some volatility
+    # 基于开收盘价增加随机波动生成最高/最低价
+    high_prices = np.maximum(open_prices, close_prices) + np.abs(rng.normal(0, 2.0, n))
+    low_prices = np.minimum(open_prices, close_prices) - np.abs(rng.normal(0, 2.0, n))
+    
+    # 模拟成交量
+    volumes = rng.exponential(150000, n).astype(np.int64) # Higher volume for 15min
 
-    df = pd.DataFrame(data_list)
+    df = pd.DataFrame({
+        'datetime': timestamps,
+        'open': np.round(open_prices, 2),
+        'high': np.round(high_prices, 2),
+        'low': np.round(low_prices, 2),
+        'close': np.round(close_prices, 2),
+        'volume': volumes
+    })
     return df
 
+def save_fictional(df):
+    """
+    保存虚构数据：安装了 polars 时写 zstd 压缩的 Parquet（Rust 实现，多线程），否则写 CSV。
+    返回写入的文件名。
+    """
+    if _POLARS_AVAILABLE:
+        pl.from_pandas(df).write_parquet(FICTIONAL_PARQUET, compression='zstd')
+        return FICTIONAL_PARQUET
+    df.to_csv(FICTIONAL_CSV, index=False)
+    return FICTIONAL_CSV
+
+def load_fictional():
+    """
+    读取 save_fictional 保存的数据，返回 pandas DataFrame（优先 Parquet，其次 CSV）。
+    """
+    if _POLARS_AVAILABLE:
+        try:
+            return pl.scan_parquet(FICTIONAL_PARQUET).collect().to_pandas()
+        except FileNotFoundError:
+            pass
+    return pd.read_csv(FICTIONAL_CSV, parse_dates=['datetime'])
+
 if __name__ == "__main__":
     df = generate_csi300_data()
     print(df.head())
     print(f"Total records: {len(df)}")
-    df.to_csv('csi300_15min_fictional.csv', index=False)
+    filename = save_fictional(df)
+    print(f"Data saved to {filename}")
@@ -1,15 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
 import threading
 import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import LRUCache, TTLCache
 
 from data_fetcher import fetch_csi300_data, get_stock_name
 from chan_core import ChanEngine
-from visualizer import plot_chan
+from visualizer import ChanPlotter
 
 class ChanVisApp:
     def __init__(self, root):
@@ -17,11 +21,21 @@ class ChanVisApp:
         self.root.title("Chan Theory Visualizer - Realtime Stock Data")
         self.root.geometry("1200x800")
         
-        # Data Cache (Thread-safe dict usually okay for simple puts/gets in Python GIL)
+        # Data Cache
+        # cachetools 的缓存不是线程安全的（读取也会调整 LRU 顺序），后台线程与主线程的所有访问都要持有 cache_lock
+        self.cache_lock = threading.Lock()
+        # 有界缓存：长时间运行时按 LRU 淘汰旧的 DataFrame，避免内存无限增长
         # Key: (symbol, period), Value: DataFrame
-        self.data_cache = {} 
-        self.name_cache = {} # Key: symbol, Value: str
-        self.loading_status = {} # Key: (symbol, period), Value: 'loading', 'done', 'error'
+        self.data_cache = LRUCache(maxsize=16)
+        self.name_cache = LRUCache(maxsize=1024) # Key: symbol, Value: str
+        # Key: (symbol, period), Value: 'loading', 'done', 'error'；过期后允许重新请求
+        self.loading_status = TTLCache(maxsize=128, ttl=300)
+        
+        # 名称查询与行情获取都是网络 I/O，放到线程池中并发执行
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        
+        # 请求序号：每次发起新的请求或切换显示时递增，后台任务据此丢弃已被取代的结果
+        self.request_epoch = 0
         
         # Current State
         self.current_symbol = '000300'
@@ -39,8 +53,12 @@ class ChanVisApp:
             ("Daily / 60 Days", 'daily', 60)
         ]
         
+        # 后台线程 -> 主线程的消息队列，由单个定时器统一取出处理
+        self.ui_queue = queue.Queue()
+        
         # UI Setup
         self.setup_ui()
+        self._drain_queue()
         
         # Initial Load
         # Don't load anything initially
@@ -49,40 +67,80 @@ class ChanVisApp:
     # REMOVED start_background_loader method
     # def start_background_loader(self): ...
 
-    def fetch_data_task(self, period, days, symbol):
+    def fetch_data_task(self, period, days, symbol, my_epoch):
         key = (symbol, period)
         try:
             print(f"[Background] Fetching {symbol} {period} data (last {days} days)...")
             
-            # Fetch name if not cached (best effort)
-            if symbol not in self.name_cache:
-                try:
-                    if symbol == '000300':
-                        name = "沪深300"
-                    else:
-                        name = get_stock_name(symbol)
-                    self.name_cache[symbol] = name
-                    print(f"[Background] Got name for {symbol}: {name}")
-                except Exception as e:
-                    print(f"[Background] Failed to get name for {symbol}: {e}")
+            # Fetch name if not cached (best effort), concurrently with the data request
+            # 不等待名称：数据先显示，名称到达后再刷新标题
+            with self.cache_lock:
+                need_name = symbol not in self.name_cache
+            if need_name:
+                self.executor.submit(self.fetch_name_task, symbol)
             
             df = fetch_csi300_data(period=period, days=days, symbol=symbol)
+            
+            # 用户已切换到其他请求：丢弃结果，下次点击时重新获取
+            if my_epoch != self.request_epoch:
+                print(f"[Background] Discarding stale {symbol} {period} data.")
+                with self.cache_lock:
+                    self.loading_status[key] = 'stale'
+                return
+            
             if not df.empty:
-                self.data_cache[key] = df
-                self.loading_status[key] = 'done'
+                with self.cache_lock:
+                    self.data_cache[key] = df
+                    self.loading_status[key] = 'done'
                 print(f"[Background] {symbol} {period} data ready.")
                 
                 # Auto-refresh UI if this is the requested one?
-                # Thread-safe UI update using after()
-                
-                # To be user friendly:
-                self.root.after(0, lambda: self.check_and_update_plot(period, symbol))
+                # 不能在后台线程操作 Tk：投递消息，由主线程的 _drain_queue 处理
+                self.ui_queue.put(('plot_ready', period, symbol))
                 
             else:
-                self.loading_status[key] = 'error'
+                with self.cache_lock:
+                    self.loading_status[key] = 'error'
         except Exception as e:
             print(f"[Background] Error fetching {symbol} {period}: {e}")
-            self.loading_status[key] = 'error'
+            with self.cache_lock:
+                self.loading_status[key] = 'error'
+
+    def fetch_name_task(self, symbol):
+        try:
+            if symbol == '000300':
+                name = "沪深300"
+            else:
+                name = get_stock_name(symbol)
+            # 查询失败时返回的是代码本身：不缓存，下次加载时重试
+            if name != symbol:
+                with self.cache_lock:
+                    self.name_cache[symbol] = name
+                self.ui_queue.put(('name_ready', symbol))
+            print(f"[Background] Got name for {symbol}: {name}")
+        except Exception as e:
+            print(f"[Background] Failed to get name for {symbol}: {e}")
+
+    def _drain_queue(self, max_messages=32):
+        """主线程定时器：每 50ms 取出一批后台消息，重复的 plot_ready / name_ready 只处理一次"""
+        ready = []
+        named = set()
+        try:
+            for _ in range(max_messages):
+                msg = self.ui_queue.get_nowait()
+                if msg[0] == 'plot_ready' and msg[1:] not in ready:
+                    ready.append(msg[1:])
+                elif msg[0] == 'name_ready':
+                    named.add(msg[1])
+        except queue.Empty:
+            pass
+        
+        for period, symbol in ready:
+            self.check_and_update_plot(period, symbol)
+        # 名称晚于数据到达：当前显示的就是该代码时重画，补上标题中的名称
+        if self.current_symbol in named:
+            self.update_plot()
+        self.root.after(50, self._drain_queue)
 
     def check_and_update_plot(self, period, symbol):
         # This is called in main thread
@@ -133,7 +191,13 @@ class ChanVisApp:
         # Main Plot Area
         self.plot_frame = ttk.Frame(self.root)
         self.plot_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
-        self.canvas = None
+        
+        # Figure 与画布只创建一次，避免销毁/重建 Tk 控件；
+        # ChanPlotter 持有子图与标准K线/笔的集合，每次刷新只更新其内容
+        self.fig = Figure(figsize=(24, 16))
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self.plot_frame)
+        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.plotter = ChanPlotter(self.fig)
 
     def on_preset_click(self, period, days):
         symbol = self.symbol_var.get().strip()
@@ -144,7 +208,11 @@ class ChanVisApp:
         key = (symbol, period)
         
         # Check cache first
-        if key in self.data_cache:
+        with self.cache_lock:
+            cached = key in self.data_cache
+            status = self.loading_status.get(key, 'unknown')
+        if cached:
+            self.request_epoch += 1
             self.current_period = period
             self.current_days = days
             self.current_symbol = symbol
@@ -153,14 +221,16 @@ class ChanVisApp:
             return
             
         # Check loading status
-        status = self.loading_status.get(key, 'unknown')
         if status == 'loading':
             messagebox.showinfo("Please Wait", "Data is still loading. Please try this option again later.\n\n后台数据正在加载中，请稍后再试。")
             return
             
         # Not loaded and not loading (e.g. error or not started)
         # Launch load immediately
-        self.loading_status[key] = 'loading'
+        self.request_epoch += 1
+        my_epoch = self.request_epoch
+        with self.cache_lock:
+            self.loading_status[key] = 'loading'
         self.status_label.config(text=f"Fetching {symbol} {period} data...")
         self.pending_request = (period, days, symbol) # Store intent
         
@@ -172,7 +242,7 @@ class ChanVisApp:
         days_to_fetch = max(days, 15) if period != 'daily' else max(days, 60)
         
         # We need to pass the updated task to thread
-        t = threading.Thread(target=self.fetch_data_task, args=(period, days_to_fetch, symbol))
+        t = threading.Thread(target=self.fetch_data_task, args=(period, days_to_fetch, symbol, my_epoch))
         t.daemon = True
         t.start()
         
@@ -180,26 +250,27 @@ class ChanVisApp:
         messagebox.showinfo("Fetching Data", f"Fetching {symbol} {period} min data... Please wait a moment.\n\n正在获取数据，请稍候。")
 
     def update_plot(self):
-        # Clear existing canvas
-        if self.canvas:
-            self.canvas.get_tk_widget().destroy()
-            plt.close('all') 
-        
         key = (self.current_symbol, self.current_period)
-        df_full = self.data_cache.get(key)
+        with self.cache_lock:
+            df_full = self.data_cache.get(key)
         if df_full is None or df_full.empty:
             return
 
         # Slice data
-        last_date = df_full['datetime'].max()
+        # df_full 已按时间升序排列（fetch_csi300_data 保证）：最后一行即最新时间，O(1) 取值
+        last_date = df_full['datetime'].iat[-1]
         start_date = last_date - timedelta(days=self.current_days)
         
+        # 同样利用有序性，二分查找切分点，无需构建整列布尔掩码
+        dt = df_full['datetime'].to_numpy()
+        i = np.searchsorted(dt, start_date.to_datetime64(), side='right')
+        
         # Reset index is crucial here!
         # When we slice, we must reset index so that ChanEngine sees 0, 1, 2...
         # and mpf.plot also plots 0, 1, 2... matching the engine's indices.
-        df_display = df_full[df_full['datetime'] > start_date].copy().reset_index(drop=True)
-        
-        if df_display.empty:
+        if i < len(dt):
+            df_display = df_full.iloc[i:].reset_index(drop=True)
+        else:
             df_display = df_full.tail(100).reset_index(drop=True) 
         
         # Run Engine
@@ -215,14 +286,10 @@ class ChanVisApp:
         if self.current_period == 'daily':
             display_period = 'Daily'
             
-        stock_name = self.name_cache.get(self.current_symbol)
+        with self.cache_lock:
+            stock_name = self.name_cache.get(self.current_symbol)
             
-        fig = plot_chan(df_display, engine, period=display_period, stock_code=self.current_symbol, stock_name=stock_name, return_figure=True)
-        
-        # Embed
-        self.canvas = FigureCanvasTkAgg(fig, master=self.plot_frame)
-        self.canvas.draw()
-        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.plotter.update(df_display, engine, period=display_period, stock_code=self.current_symbol, stock_name=stock_name)
 
 def main_gui():
     root = tk.Tk()
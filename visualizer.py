@@ -1,13 +1,25 @@
 import mplfinance as mpf
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from chan_core import ChanEngine, Direction, FenXingType
+import matplotlib.colors as mcolors
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.patches import PathPatch
+from matplotlib.path import Path
+from matplotlib.ticker import FuncFormatter
+from matplotlib.transforms import Bbox
+from chan_core import ChanEngine, Direction, FenXingType, njit
+
+try:
+    import cv2
+    _CV2_AVAILABLE = True
+except ImportError:
+    _CV2_AVAILABLE = False
 
 # =================================================================================================
 # 可视化模块 (Visualizer)
 #
-# 使用 mplfinance 库绘制K线图。
+# 使用 matplotlib 集合 (Collection) 绘制K线图，配色沿用 mplfinance 的 'charles' 样式。
 # 包含两个子图，上下对齐坐标轴：
 # 1. 原始K线图 (Raw K-Lines)
 # 2. 缠论标准K线图 (Chan Standard K-Lines)
@@ -16,124 +28,248 @@ from chan_core import ChanEngine, Direction, FenXingType
 #    - 叠加笔 (Bi)
 # =================================================================================================
 
-def plot_chan(df: pd.DataFrame, engine: ChanEngine, period: str = '15', stock_code: str = '000300', stock_name: str = None, return_figure: bool = False):
+# 原始K线的涨跌配色取自 mplfinance 的 'charles' 样式，模块加载时只生成一次
+_CHARLES_COLORS = mpf.make_marketcolors(base_mpf_style='charles')
+
+# 原始K线实体宽度与线宽随K线数量的取值表（与 mplfinance 的默认取值一致）
+_CANDLE_WIDTH_POINTS = (30, 60, 90, 120, 150, 180, 210, 240)
+_CANDLE_WIDTHS = (0.65, 0.575, 0.50, 0.445, 0.435, 0.425, 0.420, 0.415)
+_CANDLE_LINEWIDTHS = (1.00, 0.875, 0.75, 0.625, 0.500, 0.438, 0.435, 0.435)
+
+# 红涨绿跌：颜色名在模块加载时解析为 RGBA 一次，绘制时直接使用，不再逐次解析字符串
+_UP_RGBA = mcolors.to_rgba('red')
+_DOWN_RGBA = mcolors.to_rgba('green')
+
+# 单个矩形的路径指令：左下 -> 右下 -> 右上 -> 左上 -> 闭合
+_RECT_CODES = np.array([Path.MOVETO, Path.LINETO, Path.LINETO, Path.LINETO, Path.CLOSEPOLY], dtype=Path.code_type)
+_EMPTY_PATH = Path(np.empty((0, 2)))
+
+def _rects_path(lefts, bottoms, widths, heights):
+    """将一组矩形合并为一条复合 Path（每个矩形 5 个顶点），顶点数组一次性预分配"""
+    n = len(lefts)
+    rights = lefts + widths
+    tops = bottoms + heights
+    verts = np.empty((n, 5, 2))
+    verts[:, 0, 0] = verts[:, 3, 0] = verts[:, 4, 0] = lefts
+    verts[:, 1, 0] = verts[:, 2, 0] = rights
+    verts[:, 0, 1] = verts[:, 1, 1] = verts[:, 4, 1] = bottoms
+    verts[:, 2, 1] = verts[:, 3, 1] = tops
+    return Path(verts.reshape(-1, 2), np.tile(_RECT_CODES, n))
+
+@njit("Tuple((float64[::1], float64[::1], float64[::1], float64[::1], boolean[::1]))"
+      "(int64[::1], int64[::1], float64[::1], float64[::1], float64[::1], float64[::1], float64)", cache=True)
+def _chan_geom(starts, ends, opens, closes, highs, lows, bar_width_unit):
     """
-    绘制K线和缠论笔。
-    Plots the K-lines and Chan Bi.
-    
-    参数:
-        df: 原始K线数据DataFrame
-        engine: 计算完毕的ChanEngine对象，包含笔的数据
-        period: K线周期 (如 '1', '5', '15', '30')
-        stock_code: 股票代码 (如 '000001')
-        stock_name: 股票名称 (如 '贵州茅台')
-        return_figure: 是否返回 Figure 对象而不保存文件
+    标准K线的绘制几何：返回 (centers, lefts, widths, heights, is_up)。
+    - 矩形中心 = (start_idx + end_idx) / 2
+    - 宽度 = (N-1)*步长 + 最后一根的宽度
+    - is_up: 包含处理后的 Open/Close 表示的逻辑方向
+    输出数组预先分配，单次循环逐根填充，每个输入只读取一遍、不产生中间数组。
     """
-    # Ensure index is DatetimeIndex
-    if 'datetime' in df.columns:
-        df['datetime'] = pd.to_datetime(df['datetime'])
-        df.set_index('datetime', inplace=True)
-        
-    # Ensure columns are Title Case for mplfinance
-    # mplfinance expects: Open, High, Low, Close, Volume
-    df = df.rename(columns={
-        'open': 'Open',
-        'high': 'High',
-        'low': 'Low',
-        'close': 'Close',
-        'volume': 'Volume'
-    })
-    
-    # -------------------------------------------------------------------------
-    # 1. 绘图设置 (Setup)
-    # -------------------------------------------------------------------------
-    
-    # 显式配置字体，确保中文显示正常
-    # 优先尝试 Windows 常见中文字体
-    plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS'] 
-    plt.rcParams['axes.unicode_minus'] = False # 解决负号显示为方块的问题
-    
-    # 对于 mplfinance，我们也尝试传入字体配置，但上面全局配置通常更有效
-    # 注意：mplfinance 的 rc 参数会覆盖一部分 rcParams，所以这里也要指定
-    s = mpf.make_mpf_style(base_mpf_style='charles', rc={
-        'font.family': ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS'],
-        'axes.unicode_minus': False
-    })
-    
-    # 使用 mplfinance 获取 figure 和 axes，以便完全控制
-    # 我们先在 ax1 画原始K线，这样 mplfinance 会自动处理日期索引的映射（0, 1, 2...）
-    
-    # 重新构建：手动创建 Figure 和 Axes
-    fig = plt.figure(figsize=(24, 16))
-    
-    # 创建两个共享 X 轴的 subplot
-    # GridSpec 允许我们控制比例
-    gs = fig.add_gridspec(2, 1, height_ratios=[1, 1])
-    ax1 = fig.add_subplot(gs[0, 0])
-    ax2 = fig.add_subplot(gs[1, 0], sharex=ax1)
+    n = starts.shape[0]
+    centers = np.empty(n, dtype=np.float64)
+    lefts = np.empty(n, dtype=np.float64)
+    widths = np.empty(n, dtype=np.float64)
+    heights = np.empty(n, dtype=np.float64)
+    is_up = np.empty(n, dtype=np.bool_)
+    for i in range(n):
+        center = (starts[i] + ends[i]) * 0.5
+        width = (ends[i] - starts[i]) + bar_width_unit
+        centers[i] = center
+        widths[i] = width
+        lefts[i] = center - width / 2
+        heights[i] = highs[i] - lows[i]
+        is_up[i] = closes[i] >= opens[i]
+    return centers, lefts, widths, heights, is_up
+
+class ChanPlotter:
+    """
+    可复用的缠论图表绘制器 (Reusable Chan Chart Plotter)
+
+    持有 Figure、两个子图，以及标准K线的 PathPatch（涨跌各一）与笔的 LineCollection。
+    回测或实时刷新时反复调用 update()：上方原始K线整体重画，
+    下方的标准K线与笔只替换路径与线段 (set_path / set_segments)，无需清空整张图重建。
+    """
+    def __init__(self, fig=None):
+        # 显式配置字体，确保中文显示正常（需在创建标题等文字对象之前设置）
+        # 优先尝试 Windows 常见中文字体
+        plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei', 'Arial Unicode MS'] 
+        plt.rcParams['axes.unicode_minus'] = False # 解决负号显示为方块的问题
+
+        # 我们先在 ax1 画原始K线，X 坐标为行位置（0, 1, 2...），日期由刻度格式化函数换算显示
+
+        # 手动创建 Figure 和 Axes（传入 fig 时清空后复用）
+        if fig is None:
+            fig = plt.figure(figsize=(24, 16))
+        else:
+            fig.clf()
+        self.fig = fig
+
+        # 创建两个共享 X 轴的 subplot
+        # GridSpec 允许我们控制比例
+        gs = fig.add_gridspec(2, 1, height_ratios=[1, 1])
+        self.ax1 = fig.add_subplot(gs[0, 0])
+        self.ax2 = ax2 = fig.add_subplot(gs[1, 0], sharex=self.ax1)
+
+        # ax2 的标题与坐标轴样式与数据无关，只在创建时一次性设置
+        ax2.set(ylabel='Chan Price', title='Chan Standard K-Lines (Variable Width) + Bi')
+        # 与 mplfinance 的 'charles' 样式保持一致：Y 轴在右侧，X 轴刻度标签旋转 45 度
+        ax2.yaxis.set_label_position('right')
+        ax2.yaxis.tick_right()
+        ax2.tick_params(axis='x', rotation=45)
+
+        # 标准K线 (Standard K-Lines) 使用红涨绿跌
+        up_color = _UP_RGBA
+        down_color = _DOWN_RGBA
+        edge_up = _UP_RGBA
+        edge_down = _DOWN_RGBA
     
-    # 画 Panel 1: 原始K线
-    # ax=ax1 让 mpf 在指定轴上画图
-    # Use warn_too_much_data to silence warnings if needed, but for 1 min data we might have thousands of points
-    # Increase limit if needed. Default is 50.
+        # 标准K线按涨跌各合并为一条复合路径 (PathPatch)，笔用一个 LineCollection 绘制；
+        # 刷新时原地替换内容，数据范围在 _render 中统一更新
+        self.std_up_patch = PathPatch(_EMPTY_PATH, facecolor=up_color, edgecolor=edge_up,
+                                      linewidth=1) # Fixed linewidth might be too thick for dense data
+        self.std_down_patch = PathPatch(_EMPTY_PATH, facecolor=down_color, edgecolor=edge_down, linewidth=1)
+        # 端点样式与 ax.plot 的默认值一致，保持与逐条绘制时相同的外观
+        self.bi_collection = LineCollection([], linewidths=2, capstyle='projecting', joinstyle='round')
+        # add_artist 不更新数据范围（与 autolim=False 相同）
+        ax2.add_artist(self.std_up_patch)
+        ax2.add_artist(self.std_down_patch)
+        ax2.add_collection(self.bi_collection, autolim=False)
+
+    def update(self, df: pd.DataFrame, engine: ChanEngine, period: str = '15', stock_code: str = '000300', stock_name: str = None):
+        """用新的K线数据与计算结果刷新图表，并请求画布在空闲时重绘"""
+        self._render(df, engine, period, stock_code, stock_name)
+        self.fig.canvas.draw_idle()
+        return self.fig
+
+    def _draw_raw_candles(self, df, dates, title_text):
+        """
+        在 ax1 上绘制原始K线。
+        X 坐标为行位置 (0, 1, 2...)，与 ChanEngine 的索引一致；实体与影线由整列数组直接构建
+        PolyCollection / LineCollection，不经过 mplfinance 对 DataFrame 的逐行处理。
+        外观与 mplfinance 外部坐标轴模式下的 'charles' 蜡烛图一致。
+        """
+        ax1 = self.ax1
+        opens = df['open'].to_numpy(dtype=np.float64)
+        highs = df['high'].to_numpy(dtype=np.float64)
+        lows = df['low'].to_numpy(dtype=np.float64)
+        closes = df['close'].to_numpy(dtype=np.float64)
+        n = len(opens)
+        x = np.arange(n, dtype=np.float64)
+
+        # 实体宽度与线宽随K线数量变化（沿用 mplfinance 的取值表，超出范围取端点值）
+        candle_width = np.interp(n, _CANDLE_WIDTH_POINTS, _CANDLE_WIDTHS)
+        candle_linewidth = np.interp(n, _CANDLE_WIDTH_POINTS, _CANDLE_LINEWIDTHS)
+
+        # 实体：每根K线一个四边形 (N, 4, 2)，上下边为开盘/收盘价
+        left = x - candle_width / 2
+        right = x + candle_width / 2
+        body = np.empty((n, 4, 2))
+        body[:, 0, 0] = body[:, 1, 0] = left
+        body[:, 2, 0] = body[:, 3, 0] = right
+        body[:, 0, 1] = body[:, 3, 1] = opens
+        body[:, 1, 1] = body[:, 2, 1] = closes
+
+        # 影线：下影线从最低价到实体下沿，上影线从最高价到实体上沿 (2N, 2, 2)
+        wicks = np.empty((2 * n, 2, 2))
+        wicks[:, :, 0] = np.concatenate([x, x])[:, None]
+        wicks[:n, 0, 1] = lows
+        wicks[:n, 1, 1] = np.minimum(opens, closes)
+        wicks[n:, 0, 1] = highs
+        wicks[n:, 1, 1] = np.maximum(opens, closes)
+
+        # 颜色取自 'charles' 样式；与 mplfinance 相同，收盘价高于开盘价为上涨
+        # 涨、跌各用一组集合，每个集合只保存一种颜色，无需为每根K线生成颜色数组
+        colors = _CHARLES_COLORS
+        is_up = opens < closes
+        ax1.set_axisbelow(True)
+        for mask, key in ((is_up, 'up'), (~is_up, 'down')):
+            ax1.add_collection(LineCollection(wicks[np.concatenate([mask, mask])], colors=colors['wick'][key],
+                                              linewidths=candle_linewidth), autolim=False)
+            ax1.add_collection(PolyCollection(body[mask], facecolors=colors['candle'][key],
+                                              edgecolors=colors['edge'][key], linewidths=candle_linewidth), autolim=False)
+        # 集合以 autolim=False 加入，不逐个遍历顶点更新数据范围；
+        # 由外接框一次性确定，X 方向左右各多留约一根K线的距离（已覆盖所有实体与影线）
+        if n:
+            avg_dist = (n - 1) / n if n > 1 else 0.75
+            ax1.update_datalim([(-avg_dist, lows.min()), ((n - 1) + avg_dist, highs.max())])
+        ax1.autoscale_view()
+
+        # 刻度位置是行位置，按位置换算回日期显示；格式按数据密度选择
+        if n:
+            avg_days = (dates[-1] - dates[0]) / pd.Timedelta(days=1) / n
+            if avg_days < 0.33:
+                fmt = '%b %d, %H:%M' if dates[-1].date() != dates[0].date() else '%H:%M'
+            else:
+                fmt = '%Y-%b-%d' if dates[-1].year != dates[0].year else '%b %d'
+        else:
+            fmt = '%b %d'
+
+        def format_date(value, pos=None):
+            ix = int(round(value))
+            return dates[ix].strftime(fmt) if 0 <= ix < n else ''
+
+        ax1.xaxis.set_major_formatter(FuncFormatter(format_date))
+        ax1.tick_params(axis='x', rotation=45)
+        # 'charles' 样式：Y 轴在右侧
+        ax1.yaxis.set_label_position('right')
+        ax1.yaxis.tick_right()
+        ax1.set_ylabel('Raw Price')
+        ax1.set_title(title_text)
+
+    def _render(self, df, engine, period, stock_code, stock_name):
+        ax1 = self.ax1
+        ax2 = self.ax2
+
+        # 日期序列：优先使用 DatetimeIndex，否则取 datetime 列
+        # 不修改调用方的 DataFrame；已是 datetime64 时跳过解析
+        if isinstance(df.index, pd.DatetimeIndex):
+            dates = df.index
+        else:
+            dt = df['datetime']
+            if not pd.api.types.is_datetime64_any_dtype(dt):
+                dt = pd.to_datetime(dt)
+            dates = pd.DatetimeIndex(dt)
     
-    if period == 'daily':
-        title_suffix = 'Raw K-Lines (Daily)'
-    else:
-        title_suffix = f'Raw K-Lines ({period} Min)'
+        # -------------------------------------------------------------------------
+        # 1. 画 Panel 1: 原始K线
+        # -------------------------------------------------------------------------
+        if period == 'daily':
+            title_suffix = 'Raw K-Lines (Daily)'
+        else:
+            title_suffix = f'Raw K-Lines ({period} Min)'
         
-    # Build title components
-    # Logic simplified: Always use stock_code and optional stock_name
-    if stock_name:
-        title_text = f"{stock_name} {stock_code} - {title_suffix}"
-    else:
-        title_text = f"{stock_code} - {title_suffix}"
+        # Build title components
+        # Logic simplified: Always use stock_code and optional stock_name
+        if stock_name:
+            title_text = f"{stock_name} {stock_code} - {title_suffix}"
+        else:
+            title_text = f"{stock_code} - {title_suffix}"
         
-    mpf.plot(df, type='candle', style=s, ax=ax1,
-             ylabel='Raw Price',
-             warn_too_much_data=10000, 
-             axtitle=title_text)
-
-    # -------------------------------------------------------------------------
-    # 2. 画 Panel 2: 缠论标准K线 (Custom Drawing on ax2)
-    # -------------------------------------------------------------------------
-    # 为了保持 X 轴对齐，我们需要在 ax2 上使用与 ax1 相同的 X 坐标系统。
-    # mplfinance 将 DataFrame 的行索引映射为 0, 1, 2 ... len(df)-1。
-    # 因此，我们需要计算每个 Standard K-Line 对应的原始索引范围。
-    
-    # 为了让 ax2 拥有正确的 X 轴范围和刻度，我们在 ax2 上画一个透明的原始K线图
-    # 这样可以初始化 X 轴
-    mpf.plot(df, type='line', style=s, ax=ax2, 
-             linecolor='none', # 不可见
-             ylabel='Chan Price',
-             warn_too_much_data=10000,
-             axtitle='Chan Standard K-Lines (Variable Width) + Bi')
-
-    # 现在手动在 ax2 上添加矩形 (Standard K-Lines)
-    # 颜色定义
-    # s 是一个字典，但 structure 可能不同，通常 mplfinance style object 是 dict
-    # 如果 make_mpf_style 返回的是 dict，我们需要检查 key
-    # 'charles' style: up is green, down is red usually (in China red is up, green is down)
-    # mplfinance 默认 'charles': up=green, down=red.
-    # 但我们想要 红涨绿跌。
-    # 我们可以直接指定颜色。
+        # 刷新时先清空 ax1 上一次的原始K线再重画；
+        # 共享 X 轴的自动缩放取两个子图数据范围的并集，同时清掉 ax2 上一次的范围，K线变少时 X 轴才能收窄
+        ax1.clear()
+        ax2.dataLim.set(Bbox.null())
+        ax2.ignore_existing_data_limits = True
+        self._draw_raw_candles(df, dates, title_text)
+
+        # -------------------------------------------------------------------------
+        # 2. 画 Panel 2: 缠论标准K线 (Custom Drawing on ax2)
+        # -------------------------------------------------------------------------
+        # 为了保持 X 轴对齐，我们需要在 ax2 上使用与 ax1 相同的 X 坐标系统。
+        # ax1 将 DataFrame 的行索引映射为 0, 1, 2 ... len(df)-1。
+        # 因此，我们需要计算每个 Standard K-Line 对应的原始索引范围。
     
-    # 手动定义红涨绿跌
-    up_color = 'red'
-    down_color = 'green'
-    edge_up = 'red'
-    edge_down = 'green'
+        # ax2 与 ax1 共享 X 轴（sharex）：X 范围、刻度定位器与格式化器本就是同一组对象，
+        # 已由 ax1 的原始K线绘制确定，ax2 上无需再设置
+
+        # 预先取出每根标准K线覆盖的原始K线索引范围，中心坐标由下面的 _chan_geom 算出，供矩形与笔共用
+        # 标准K线在构建时已记录首尾原始K线索引 (start_index / end_index)，直接读取即可
+        std_klines = engine.standard_klines
+        n_std = len(std_klines)
+        starts = np.fromiter((k.start_index for k in std_klines), dtype=np.int64, count=n_std)
+        ends = np.fromiter((k.end_index for k in std_klines), dtype=np.int64, count=n_std)
     
-    # 遍历标准K线
-    for k in engine.standard_klines:
-        # 获取该标准K线包含的原始K线索引范围
-        raw_indices = [rk.index for rk in k.original_klines]
-        if not raw_indices:
-            continue
-            
-        start_idx = min(raw_indices)
-        end_idx = max(raw_indices)
-        
         # 计算绘制参数
         # 宽度：覆盖的原始K线数量 + 间隙
         # 规则：(1 + Merged_Count) * Unit_Width + Merged_Count * Gap
@@ -150,95 +286,134 @@ def plot_chan(df: pd.DataFrame, engine: ChanEngine, period: str = '15', stock_co
         # 其实最简单的逻辑是：该标准K线代表了原始数据中的 start_idx 到 end_idx。
         # 我们就让这个矩形覆盖从 start_idx - 0.4 到 end_idx + 0.4 的范围。
         # 这样它就完美对齐了上面对应的原始K线区域。
-        
+    
         # 原始K线的中心是 idx (整数)。宽度一般是 0.6 或 0.8。
         # 假设宽度 0.8，则范围是 [idx - 0.4, idx + 0.4]。
         # 如果包含 [5, 6, 7]，则覆盖范围是 [5-0.4, 7+0.4] = [4.6, 7.4]。
         # 宽度 = 7.4 - 4.6 = 2.8。
         # 中心 = (4.6 + 7.4) / 2 = 6.0。
-        
+    
         # 这种算法完美符合 "宽度随包含数量增加" 的直觉。
-        
-        count = end_idx - start_idx + 1
+    
+        # 几何与颜色按整列计算，不再逐根K线做属性读取与条件判断
+        opens = np.fromiter((k.open for k in std_klines), dtype=np.float64, count=n_std)
+        closes = np.fromiter((k.close for k in std_klines), dtype=np.float64, count=n_std)
+        highs = np.fromiter((k.high for k in std_klines), dtype=np.float64, count=n_std)
+        lows = np.fromiter((k.low for k in std_klines), dtype=np.float64, count=n_std)
+    
         bar_width_unit = 0.8 # 原始单根K线的视觉宽度
-        total_width = (count - 1) * 1.0 + bar_width_unit # (N-1)*步长 + 最后一根的宽度
-        
-        # 矩形中心计算
-        # start_idx 的左边缘: start_idx - bar_width_unit/2
-        # end_idx 的右边缘: end_idx + bar_width_unit/2
-        # 中心 = (左 + 右) / 2 = (start_idx + end_idx) / 2
-        
-        width = total_width
-        x_center = (start_idx + end_idx) / 2.0
-        
-        # 高度和底部
-        # 无影线：只画实体，从 Low 到 High
-        height = k.high - k.low
-        bottom = k.low
-        
-        # 颜色
-        is_up = k.close >= k.open # 这里的 Open/Close 是包含处理后的逻辑方向
-        face_color = up_color if is_up else down_color
-        edge_color = edge_up if is_up else edge_down
-        
-        # 绘制矩形
-        # Use relative width based on data density? No, width is logical.
-        # But if width is too small on screen (e.g. 1000 bars), it might disappear or look like a line.
-        # Ensure minimum width visibility if needed, but rect width corresponds to x-axis units.
-        rect = patches.Rectangle(
-            (x_center - width/2, bottom), # (left, bottom)
-            width, 
-            height,
-            linewidth=1, # Fixed linewidth might be too thick for dense data
-            edgecolor=edge_color,
-            facecolor=face_color
-        )
-        ax2.add_patch(rect)
-
-    # -------------------------------------------------------------------------
-    # 3. 画笔 (Bi) on Panel 2
-    # -------------------------------------------------------------------------
-    # 笔连接的是分型点。我们需要找到分型点对应的 X 坐标。
-    # 最好使用标准K线的中心坐标。
+        # 中心、宽度、左边界、高度与涨跌在 _chan_geom 中一次算出；底部即最低价（无影线，实体从 Low 到 High）
+        centers, lefts, widths, heights, is_up = _chan_geom(starts, ends, opens, closes, highs, lows, bar_width_unit)
+        bottoms = lows
     
-    def get_k_center(k_line):
-        raw_indices = [rk.index for rk in k_line.original_klines]
-        if not raw_indices:
-            return k_line.index # Fallback
-        return (min(raw_indices) + max(raw_indices)) / 2.0
-
-    for bi in engine.bis:
-        start_k = bi.start_fx.k_line
-        end_k = bi.end_fx.k_line
-        
-        x1 = get_k_center(start_k)
-        x2 = get_k_center(end_k)
-        
-        y1 = 0.0
-        y2 = 0.0
+        # 矩形不再逐个构造 Rectangle：按涨跌分组，用整列数组一次填好顶点，
+        # 各自合并成一条复合路径，刷新时只替换路径
+        # Width is logical (x-axis units); on dense data a bar may look like a line.
+        is_down = ~is_up
+        self.std_up_patch.set_path(_rects_path(lefts[is_up], bottoms[is_up], widths[is_up], heights[is_up]))
+        self.std_down_patch.set_path(_rects_path(lefts[is_down], bottoms[is_down], widths[is_down], heights[is_down]))
+
+        # -------------------------------------------------------------------------
+        # 3. 画笔 (Bi) on Panel 2
+        # -------------------------------------------------------------------------
+        # 笔连接的是分型点。我们需要找到分型点对应的 X 坐标。
+        # 最好使用标准K线的中心坐标。
+    
+        # 中心坐标表在上面只计算一次：分型带有其中间K线在 standard_klines 中的位置 std_idx，
+        # 直接按位置查表；没有 std_idx 的分型（外部构造）才退回到按对象建立的字典
+        center_map = None
+
+        def get_fx_center(fx):
+            nonlocal center_map
+            if fx.std_idx is not None:
+                return centers[fx.std_idx]
+            if center_map is None:
+                center_map = {id(k): c for k, c in zip(std_klines, centers.tolist())}
+            return center_map.get(id(fx.k_line), fx.k_line.index)
+
+        # 所有笔的线段收集到预分配数组中，最后以一个 LineCollection 绘制，而不是每笔一次 ax2.plot
+        # 端点坐标与方向先按列取出，再用 np.where 统一选择 y 坐标和颜色，不再逐笔分支：
+        # 向下笔从顶分型高点连到底分型低点（绿），向上笔从底分型低点连到顶分型高点（红）
+        bis = engine.bis
+        n_bi = len(bis)
+        bi_down = np.fromiter((bi.direction == Direction.DOWN for bi in bis), dtype=bool, count=n_bi)
+        start_high = np.fromiter((bi.start_fx.high for bi in bis), dtype=np.float64, count=n_bi)
+        start_low = np.fromiter((bi.start_fx.low for bi in bis), dtype=np.float64, count=n_bi)
+        end_high = np.fromiter((bi.end_fx.high for bi in bis), dtype=np.float64, count=n_bi)
+        end_low = np.fromiter((bi.end_fx.low for bi in bis), dtype=np.float64, count=n_bi)
+
+        segments = np.empty((n_bi, 2, 2))
+        try:
+            # 引擎生成的分型都带有 std_idx：取出整数位置后一次性从中心坐标表中按位置取值
+            start_pos = np.fromiter((bi.start_fx.std_idx for bi in bis), dtype=np.int64, count=n_bi)
+            end_pos = np.fromiter((bi.end_fx.std_idx for bi in bis), dtype=np.int64, count=n_bi)
+            segments[:, 0, 0] = centers[start_pos]
+            segments[:, 1, 0] = centers[end_pos]
+        except TypeError:
+            segments[:, 0, 0] = np.fromiter((get_fx_center(bi.start_fx) for bi in bis), dtype=np.float64, count=n_bi)
+            segments[:, 1, 0] = np.fromiter((get_fx_center(bi.end_fx) for bi in bis), dtype=np.float64, count=n_bi)
+        segments[:, 0, 1] = np.where(bi_down, start_high, start_low)
+        segments[:, 1, 1] = np.where(bi_down, end_low, end_high)
+        bi_colors = np.where(bi_down[:, None], _DOWN_RGBA, _UP_RGBA) # (N, 4) RGBA，无需再解析颜色名
+
+        self.bi_collection.set_segments(segments)
+        self.bi_collection.set_color(bi_colors)
+
+        # 集合以 autolim=False 加入，这里按全部矩形的外接框一次性更新 ax2 的数据范围（笔的端点都在其内），
+        # X 轴范围已与 ax1 一致，只需自动缩放 Y 轴
+        ax2.ignore_existing_data_limits = True
+        if n_std:
+            ax2.update_datalim([(lefts.min(), lows.min()), ((lefts + widths).max(), highs.max())])
+        ax2.autoscale_view(scalex=False)
+
+def plot_chan(df: pd.DataFrame, engine: ChanEngine, period: str = '15', stock_code: str = '000300', stock_name: str = None, return_figure: bool = False, fig=None, writer: str = 'mpl'):
+    """
+    绘制K线和缠论笔。
+    Plots the K-lines and Chan Bi.
+    
+    参数:
+        df: 原始K线数据DataFrame
+        engine: 计算完毕的ChanEngine对象，包含笔的数据
+        period: K线周期 (如 '1', '5', '15', '30')
+        stock_code: 股票代码 (如 '000001')
+        stock_name: 股票名称 (如 '贵州茅台')
+        return_figure: 是否返回 Figure 对象而不保存文件
+        fig: 可选，复用已有的 Figure（先清空再重绘），避免反复创建/销毁 Figure
+        writer: 保存 PNG 的方式，'mpl' 使用 matplotlib；'cv2' 直接取 Agg 画布像素交给 OpenCV
+                以压缩等级 1 编码（批量出图更快，未安装 opencv-python 时回退到 matplotlib）
+    """
+    # 需要反复刷新同一张图时，直接持有 ChanPlotter 并调用 update()
+    owns_figure = fig is None
+    plotter = ChanPlotter(fig)
+    fig = plotter.fig
+
+    try:
+        plotter._render(df, engine, period, stock_code, stock_name)
+
+        if return_figure:
+            return fig
         
-        color = ''
-        if bi.direction == Direction.DOWN:
-            y1 = bi.start_fx.high
-            y2 = bi.end_fx.low
-            color = 'green'
+        # 保存图片
+        # Only save if NOT returning figure (though this branch is likely unused in GUI mode)
+        if period == 'daily':
+            filename = 'chan_chart_daily.png'
         else:
-            y1 = bi.start_fx.low
-            y2 = bi.end_fx.high
-            color = 'red'
-            
-        ax2.plot([x1, x2], [y1, y2], color=color, linewidth=2)
-
-    if return_figure:
-        return fig
-    
-    # 保存图片
-    # Only save if NOT returning figure (though this branch is likely unused in GUI mode)
-    if period == 'daily':
-        filename = 'chan_chart_daily.png'
-    else:
-        filename = f'chan_chart_{period}m.png'
+            filename = f'chan_chart_{period}m.png'
         
-    fig.savefig(filename, bbox_inches='tight')
-    print(f"Chart saved to {filename}")
-
+        # 先 tight_layout 收紧边距，再以低压缩等级保存：bbox_inches='tight' 会让 savefig 渲染两遍，
+        # 而 zlib 默认等级 6 在大尺寸图上编码很慢；等级 1 文件略大但保存快得多
+        fig.tight_layout()
+        if writer == 'cv2' and _CV2_AVAILABLE and hasattr(fig.canvas, 'buffer_rgba'):
+            # 只渲染一次画布，RGBA 像素直接交给 libpng 编码，跳过 matplotlib 的 PNG 保存流程
+            fig.canvas.draw()
+            rgba = np.asarray(fig.canvas.buffer_rgba())
+            cv2.imwrite(filename, cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGR), [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        else:
+            if writer == 'cv2':
+                print("opencv-python not available, falling back to matplotlib PNG writer.")
+            fig.savefig(filename, pil_kwargs={'compress_level': 1})
+        print(f"Chart saved to {filename}")
+    finally:
+        # 不返回 Figure 时，保存后关闭本函数创建的 Figure，避免批量/回测中 pyplot 注册表持续累积
+        if owns_figure and not return_figure:
+            plt.close(fig)